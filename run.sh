@@ -3,12 +3,14 @@ cd src
 # requirements
 pip install fastapi
 pip install uvicorn
-pip install sqlalchemy 
+pip install "sqlalchemy[asyncio]"
+pip install aiosqlite
 pip install passlib
 pip install bcrypt
 pip install python-jose
 pip install python-multipart
 pip install aiofiles
+pip install pillow
 pip install requests
 pip install pytest
 
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException, status
 from fastapi.param_functions import Depends
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
-from sqlalchemy.orm.session import Session
-from db.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import get_async_db
 from db import models
 from db.hash import Hash
 from auth import oauth2
@@ -13,12 +14,16 @@ router = APIRouter(
 
 
 @router.post('/token')
-def get_token(request: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.DbUser).filter(models.DbUser.username == request.username).first()
+async def get_token(request: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(models.DbUser).where(models.DbUser.username == request.username))
     if not user or not user.is_active:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invalid credentials")
-    if not Hash.verify(user.password, request.password):
+    valid, new_password_hash = await Hash.verify_and_update_async(user.password, request.password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Incorrect password")
+    if new_password_hash is not None:
+        user.password = new_password_hash
+        await db.commit()
 
     access_token = oauth2.create_access_token(data={'sub': user.username})
 
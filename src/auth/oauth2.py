@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from db.database import get_db
 from fastapi import HTTPException, status
 from db import db_user
+from auth.user_cache import UserSnapshot, user_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -33,15 +34,22 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         detail='Could not validate credentials',
         headers={"WWW-Authenticate": "Bearer"}
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    claims = user_cache.get_claims(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
             raise credentials_exception
-    except JWTError:
+        user_cache.put_claims(token, claims)
+    username: str = claims.get("sub")
+    if username is None:
         raise credentials_exception
 
-    user = db_user.get_user(db, username)
+    user = user_cache.get_user(username)
+    if user is None:
+        generation = user_cache.generation
+        user = UserSnapshot.from_db(db_user.get_user(db, username))
+        user_cache.put_user(user, generation)
 
     # if user is None or username != "admin":
     #     raise credentials_exception
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from db.models import DbUser
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL', 60))
+CHANGED_USERS_KEY = 'changed_user_ids'
+
+
+class UserSnapshot(NamedTuple):
+    # immutable copy of the columns routes read from the current user, shared between requests
+    id: int
+    username: str
+    email: str
+    first_name: str
+    last_name: str
+    is_active: bool
+    is_admin: bool
+    profile_picture: Optional[str]
+
+    @classmethod
+    def from_db(cls, user: DbUser) -> 'UserSnapshot':
+        return cls(user.id, user.username, user.email, user.first_name, user.last_name,
+                   user.is_active, user.is_admin, user.profile_picture)
+
+
+class UserCache:
+    # token -> decoded claims and username -> snapshot, both LRU bounded and expiring after ttl seconds
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.claims: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.users: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.usernames_by_id = {}
+        self.generation = 0
+
+    def get_claims(self, token: str) -> Optional[dict]:
+        with self.lock:
+            return self.lookup(self.claims, token)
+
+    def put_claims(self, token: str, claims: dict):
+        deadline = time.monotonic() + self.ttl
+        if 'exp' in claims:
+            # never serve claims of a token past its own expiry
+            deadline = min(deadline, time.monotonic() + claims['exp'] - time.time())
+        with self.lock:
+            self.store(self.claims, token, (claims, deadline))
+
+    def get_user(self, username: str) -> Optional[UserSnapshot]:
+        with self.lock:
+            return self.lookup(self.users, username)
+
+    def put_user(self, user: UserSnapshot, generation: int):
+        with self.lock:
+            # a user changed while the snapshot was loaded, it may already be stale
+            if generation != self.generation:
+                return
+            self.store(self.users, user.username, (user, time.monotonic() + self.ttl))
+            self.usernames_by_id[user.id] = user.username
+
+    def invalidate(self, *user_ids: int):
+        with self.lock:
+            self.generation += 1
+            for user_id in user_ids:
+                username = self.usernames_by_id.pop(user_id, None)
+                if username is not None:
+                    self.users.pop(username, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.claims.clear()
+            self.users.clear()
+            self.usernames_by_id.clear()
+
+    def lookup(self, entries: OrderedDict, key: str):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        value, deadline = entry
+        if deadline <= time.monotonic():
+            self.discard(entries, key)
+            return None
+        entries.move_to_end(key)
+        return value
+
+    def store(self, entries: OrderedDict, key: str, entry: tuple):
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            self.discard(entries, next(iter(entries)))
+
+    def discard(self, entries: OrderedDict, key: str):
+        value, _ = entries.pop(key)
+        if isinstance(value, UserSnapshot) and self.usernames_by_id.get(value.id) == key:
+            del self.usernames_by_id[value.id]
+
+
+user_cache = UserCache()
+
+
+# ORM changes of users (is_active, is_admin, profile_picture, deletes) drop their snapshots once committed;
+# bulk UPDATE/DELETE statements bypass the flush and call user_cache.invalidate themselves
+@event.listens_for(Session, 'before_flush')
+def collect_changed_users(session, flush_context, instances):
+    changed = {user.id for user in session.deleted if isinstance(user, DbUser)}
+    changed.update(user.id for user in session.dirty
+                   if isinstance(user, DbUser) and session.is_modified(user, include_collections=False))
+    if changed:
+        session.info.setdefault(CHANGED_USERS_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_users(session):
+    changed = session.info.pop(CHANGED_USERS_KEY, None)
+    if changed:
+        user_cache.invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changed_users(session):
+    session.info.pop(CHANGED_USERS_KEY, None)
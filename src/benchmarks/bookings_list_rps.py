@@ -0,0 +1,75 @@
+"""Requests per second of GET /bookings/list under concurrent load.
+
+Start the API first (e.g. uvicorn main:app from src/), then from src/:
+python -m benchmarks.bookings_list_rps --url http://127.0.0.1:8000 --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, timedelta
+import httpx
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> dict:
+    response = await client.post('/token', data={'username': username, 'password': password})
+    response.raise_for_status()
+    return {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+
+async def seed_bookings(client: httpx.AsyncClient, headers: dict, count: int):
+    # one-room stays of the seeded 10-room type spread over the years, so none runs out of capacity
+    bookings = [{'hotel_id': 1, 'room_id': 2, 'guests_count': 1, 'rooms_amount': 1,
+                 'checkin': str(date(2040, 1, 1) + timedelta(days=2 * index)),
+                 'checkout': str(date(2040, 1, 2) + timedelta(days=2 * index))} for index in range(count)]
+    response = await client.post('/bookings/batch', json={'bookings': bookings}, headers=headers)
+    response.raise_for_status()
+
+
+async def run(url: str, requests_count: int, concurrency: int, limit: int, seed: int):
+    async with httpx.AsyncClient(base_url=url, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        headers = await login(client, 'admin', 'admin123')
+        if seed:
+            await seed_bookings(client, headers, seed)
+        params = {'limit': limit}
+        await client.get('/bookings/list', params=params, headers=headers)
+
+        latencies = []
+        failures = 0
+        remaining = iter(range(requests_count))
+
+        async def worker():
+            nonlocal failures
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.get('/bookings/list', params=params, headers=headers)
+                except httpx.HTTPError:
+                    failures += 1
+                    continue
+                if response.status_code != 200:
+                    failures += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    # only successful responses count towards the rate and the latencies
+    print(f"{requests_count} requests, concurrency {concurrency}: {len(latencies) / elapsed:.0f} req/s, "
+          f"{failures} failed, p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=20, help='page size of every request')
+    parser.add_argument('--seed', type=int, default=0, help='bookings to create through /bookings/batch first')
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests, args.concurrency, args.limit, args.seed))
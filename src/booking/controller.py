@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, status
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Response, status
+from fastapi.responses import StreamingResponse
 from booking.service import BookingService
-from booking.dto import BookingDto, BookingPostRequest
+from booking.dto import BookingDto, BookingPostRequest, BookingBatchRequest, BookingBatchDto, BookingHoldRequest, \
+    BookingHoldDto
 from auth.oauth2 import get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import get_async_db
 from schemas import UserBase
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NDJSON_MEDIA_TYPE, set_next_cursor
 
 router = APIRouter(
     prefix='/bookings',
@@ -12,39 +18,66 @@ router = APIRouter(
 
 @router.get('/list',
             summary='Retrieve list of all bookings',
-            description='Retrieve list of all bookings from the application''s database',
+            description='Retrieve list of all bookings from the application''s database, '
+                        'paginated by booking id (pass the X-Next-After header back as `after`) '
+                        'or streamed as NDJSON when `stream` is set',
             response_description="List of all bookings")
-def get_all_bookings(current_user: UserBase = Depends(get_current_user)):
-    service = BookingService(current_user)
-    return service.get_all()
+async def get_all_bookings(response: Response, after: Optional[int] = None,
+                           limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), stream: bool = False,
+                           db: AsyncSession = Depends(get_async_db),
+                           current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    if stream:
+        return StreamingResponse(service.stream_all(after), media_type=NDJSON_MEDIA_TYPE)
+    bookings = await service.get_all(after, limit)
+    set_next_cursor(response, bookings, limit)
+    return bookings
 
 
 @router.get('/list_my_bookings',
             summary='Retrieve list of all bookings made by current user',
-            description='Retrieve list of all bookings made by current user from the application''s database',
+            description='Retrieve list of all bookings made by current user from the application''s database, '
+                        'paginated by booking id or streamed as NDJSON',
             response_description="List of all my bookings")
-def get_all_my_bookings(current_user: UserBase = Depends(get_current_user)):
-    service = BookingService(current_user)
-    return service.get_bookings_by_username(current_user.username)
+async def get_all_my_bookings(response: Response, after: Optional[int] = None,
+                              limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), stream: bool = False,
+                              db: AsyncSession = Depends(get_async_db),
+                              current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    if stream:
+        return StreamingResponse(service.stream_bookings_by_username(current_user.username, after),
+                                 media_type=NDJSON_MEDIA_TYPE)
+    bookings = await service.get_bookings_by_username(current_user.username, after, limit)
+    set_next_cursor(response, bookings, limit)
+    return bookings
 
 
 @router.get('/list_my_hotels_bookings',
             summary='Retrieve list of all bookings made for current user''s hotels',
             description='Retrieve list of all bookings made for current user''s hotels '
-                        'from the application''s database',
+                        'from the application''s database, paginated by booking id or streamed as NDJSON',
             response_description="List of all bookings for my hotels")
-def get_my_hotels_bookings(current_user: UserBase = Depends(get_current_user)):
-    service = BookingService(current_user)
-    return service.get_bookings_by_hotels_username(current_user.username)
+async def get_my_hotels_bookings(response: Response, after: Optional[int] = None,
+                                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), stream: bool = False,
+                                 db: AsyncSession = Depends(get_async_db),
+                                 current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    if stream:
+        return StreamingResponse(service.stream_bookings_by_hotels_username(current_user.username, after),
+                                 media_type=NDJSON_MEDIA_TYPE)
+    bookings = await service.get_bookings_by_hotels_username(current_user.username, after, limit)
+    set_next_cursor(response, bookings, limit)
+    return bookings
 
 
 @router.get('/{booking_id}',
             summary='Retrieve booking by id',
             description='Retrieve booking by id from the application''s database',
             response_description="Booking")
-def get_booking_by_id(booking_id: int, current_user: UserBase = Depends(get_current_user)):
-    service = BookingService(current_user)
-    return service.get_by_id(booking_id)
+async def get_booking_by_id(booking_id: int, db: AsyncSession = Depends(get_async_db),
+                            current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    return await service.get_by_id(booking_id)
 
 
 @router.post('/create_for_user',
@@ -53,20 +86,60 @@ def get_booking_by_id(booking_id: int, current_user: UserBase = Depends(get_curr
              description='Create new booking with given parameters for given user',
              response_description="New created booking with id for given user",
              status_code=status.HTTP_201_CREATED)
-def create_for_user(username: str, request: BookingPostRequest, current_user: UserBase = Depends(get_current_user)):
-    service = BookingService(current_user)
-    return service.create_for_user(request, username)
+async def create_for_user(username: str, request: BookingPostRequest, db: AsyncSession = Depends(get_async_db),
+                          current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    return await service.create_for_user(request, username)
 
 
 @router.post('/',
              response_model=BookingDto,
              summary='Create new booking with given parameters',
-             description='Create new booking with given parameters',
+             description='Create new booking with given parameters. Passing `hold_id` of a matching hold '
+                         'turns the hold into the booking',
              response_description="New created booking with id",
              status_code=status.HTTP_201_CREATED)
-def add(request: BookingPostRequest, current_user: UserBase = Depends(get_current_user)):
-    service = BookingService(current_user)
-    return service.add_current_user(request)
+async def add(request: BookingPostRequest, hold_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db),
+              current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    return await service.add_current_user(request, hold_id)
+
+
+@router.post('/holds',
+             response_model=BookingHoldDto,
+             summary='Hold rooms for a few minutes',
+             description='Set rooms aside for the current user until `expires_at`, '
+                         'pass the hold id to create booking to book them',
+             response_description="New created hold with id",
+             status_code=status.HTTP_201_CREATED)
+async def add_hold(request: BookingHoldRequest, db: AsyncSession = Depends(get_async_db),
+                   current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    return await service.add_hold(request)
+
+
+@router.delete('/holds/{hold_id}',
+               summary='Release hold by id',
+               description='Release rooms held by the current user before the hold expires',
+               response_description="Returns HTTP status = 204",
+               status_code=status.HTTP_204_NO_CONTENT)
+async def remove_hold(hold_id: str, db: AsyncSession = Depends(get_async_db),
+                      current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    await service.remove_hold(hold_id)
+
+
+@router.post('/batch',
+             response_model=BookingBatchDto,
+             summary='Create many bookings at once',
+             description='Create all valid bookings of the batch in one transaction, for the current user or '
+                         '(admins only) for the given user. Items that cannot be booked are reported by index',
+             response_description="New created bookings and errors of rejected items",
+             status_code=status.HTTP_201_CREATED)
+async def add_batch(request: BookingBatchRequest, username: Optional[str] = None,
+                    db: AsyncSession = Depends(get_async_db), current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    return await service.add_batch(request, username)
 
 
 @router.put('/{booking_id}',
@@ -75,9 +148,10 @@ def add(request: BookingPostRequest, current_user: UserBase = Depends(get_curren
             description='Update existed booking in the application''s database with given parameters',
             response_description="Updated booking",
             status_code=status.HTTP_200_OK)
-def update(booking_id: int, request: BookingPostRequest, current_user: UserBase = Depends(get_current_user)):
-    service = BookingService(current_user)
-    return service.update(booking_id, request)
+async def update(booking_id: int, request: BookingPostRequest, db: AsyncSession = Depends(get_async_db),
+                 current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    return await service.update(booking_id, request)
 
 
 @router.delete('/{booking_id}',
@@ -85,6 +159,7 @@ def update(booking_id: int, request: BookingPostRequest, current_user: UserBase
                description='Delete booking by id from the application''s database',
                response_description="Returns HTTP status = 204",
                status_code=status.HTTP_204_NO_CONTENT)
-def remove(booking_id: int, current_user: UserBase = Depends(get_current_user)):
-    service = BookingService(current_user)
-    service.remove(booking_id)
+async def remove(booking_id: int, db: AsyncSession = Depends(get_async_db),
+                 current_user: UserBase = Depends(get_current_user)):
+    service = BookingService(db, current_user)
+    await service.remove(booking_id)
@@ -1,6 +1,10 @@
 import datetime
+from typing import List
 from schemas import Hotel
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
+from rooms.holds import DEFAULT_HOLD_MINUTES, MAX_HOLD_MINUTES
+
+MAX_BATCH_SIZE = 500
 
 
 class BookingDto(BaseModel):
@@ -30,3 +34,32 @@ class BookingPostRequest(BaseModel):
         if val <= 0:
             raise ValueError(f"Value {val} is incorrect. Should be positive")
         return val
+
+
+class BookingBatchRequest(BaseModel):
+    bookings: List[BookingPostRequest] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class BookingBatchErrorDto(BaseModel):
+    index: int
+    detail: str
+
+
+class BookingBatchDto(BaseModel):
+    created: List[BookingDto]
+    errors: List[BookingBatchErrorDto]
+
+
+class BookingHoldRequest(BookingPostRequest):
+    minutes: int = Field(DEFAULT_HOLD_MINUTES, ge=1, le=MAX_HOLD_MINUTES)
+
+
+class BookingHoldDto(BaseModel):
+    id: str
+    client_username: str
+    hotel_id: int
+    room_id: int
+    rooms_amount: int
+    checkin: datetime.date
+    checkout: datetime.date
+    expires_at: datetime.datetime
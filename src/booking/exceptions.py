@@ -11,3 +11,8 @@ class BookingNotFoundException(Exception):
 class BookingException(Exception):
  def __init__(self, message: str):
     self.message = message
+
+
+class BookingConflictException(Exception):
+ def __init__(self, message: str):
+    self.message = message
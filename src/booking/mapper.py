@@ -1,6 +1,7 @@
 from db.models import DbBooking
-from booking.dto import BookingDto, BookingPostRequest
+from booking.dto import BookingDto, BookingPostRequest, BookingHoldDto
 from db.models import DbUser, DbHotel, DbRoom
+from rooms.holds import Hold
 
 
 def db_booking_to_dto(entity: DbBooking):
@@ -38,3 +39,16 @@ def booking_request_to_db(request: BookingPostRequest, user: DbUser,
     db.room = room
     db.room_id = request.room_id
     return db
+
+
+def hold_to_dto(hold: Hold):
+    return BookingHoldDto(
+        id=hold.id,
+        client_username=hold.username,
+        hotel_id=hold.hotel_id,
+        room_id=hold.room_id,
+        rooms_amount=hold.rooms_amount,
+        checkin=hold.checkin,
+        checkout=hold.checkout,
+        expires_at=hold.expires_at
+    )
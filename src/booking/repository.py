@@ -1,29 +1,61 @@
-from sqlalchemy.orm.session import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload, raiseload
 from typing import List, Optional
 from db.models import DbBooking, DbHotel, DbUser
+from pagination import STREAM_CHUNK_SIZE
+
+JOINED_LOADER = 'joined'
+SELECTIN_LOADER = 'selectin'
 
 
 class BookingRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, loader: str = JOINED_LOADER):
         self.db = db
-
-    def get(self, booking_id: int) -> Optional[DbBooking]:
-        return self.db.get(DbBooking, booking_id)
-
-    def get_all(self):
-        return self.db.query(DbBooking).all()
-
-    def get_bookings_by_hotels_username(self, user_name: str):
-        return self.db.query(DbBooking).join(DbHotel).join(DbUser).filter(DbUser.username == user_name).all()
-
-    def get_bookings_by_username(self, user_name: str):
-        return (self.db.query(DbBooking).join(DbUser, onclause=DbBooking.client_id == DbUser.id)
-                .filter(DbUser.username == user_name).all())
+        self.loader = loader
+
+    def loader_options(self, loader: Optional[str] = None):
+        # Relationships read by db_booking_to_dto; any other lazy load on a listed booking raises
+        load = selectinload if (loader or self.loader) == SELECTIN_LOADER else joinedload
+        return [load(DbBooking.client), load(DbBooking.hotel), load(DbBooking.room), raiseload('*')]
+
+    async def get(self, booking_id: int) -> Optional[DbBooking]:
+        # ratings are loaded too, deleting a booking detaches them and lazy loads are not possible here
+        return await self.db.get(DbBooking, booking_id,
+                                 options=[joinedload(DbBooking.client), joinedload(DbBooking.hotel),
+                                          joinedload(DbBooking.room), selectinload(DbBooking.ratings)])
+
+    async def get_user(self, username: str) -> Optional[DbUser]:
+        return await self.db.scalar(select(DbUser).where(DbUser.username == username))
+
+    def get_all(self, loader: Optional[str] = None):
+        return select(DbBooking).options(*self.loader_options(loader))
+
+    def get_bookings_by_hotels_username(self, user_name: str, loader: Optional[str] = None):
+        return (select(DbBooking).join(DbHotel).join(DbUser, onclause=DbHotel.user_id == DbUser.id)
+                .where(DbUser.username == user_name)
+                .options(*self.loader_options(loader)))
+
+    def get_bookings_by_username(self, user_name: str, loader: Optional[str] = None):
+        return (select(DbBooking).join(DbUser, onclause=DbBooking.client_id == DbUser.id)
+                .where(DbUser.username == user_name)
+                .options(*self.loader_options(loader)))
+
+    async def page(self, query, after: Optional[int] = None, limit: Optional[int] = None) -> List[DbBooking]:
+        if after is not None:
+            query = query.where(DbBooking.id > after)
+        return list(await self.db.scalars(query.order_by(DbBooking.id).limit(limit)))
+
+    async def stream(self, query, after: Optional[int] = None):
+        if after is not None:
+            query = query.where(DbBooking.id > after)
+        async for booking in await self.db.stream_scalars(
+                query.order_by(DbBooking.id).execution_options(yield_per=STREAM_CHUNK_SIZE)):
+            yield booking
 
     def add(self, booking: DbBooking) -> DbBooking:
         self.db.add(booking)
         return booking
 
-    def remove(self, booking: DbBooking) -> None:
-        self.db.delete(booking)
+    async def remove(self, booking: DbBooking) -> None:
+        await self.db.delete(booking)
@@ -1,132 +1,263 @@
 from datetime import date
 from typing import Optional
 from booking.repository import BookingRepository
-from booking.dto import BookingDto, BookingPostRequest
-from db.database import get_db
-from booking.mapper import db_booking_to_dto, booking_request_to_db
-from booking.exceptions import BookingNotFoundException, BookingException
+from booking.dto import BookingDto, BookingPostRequest, BookingBatchRequest, BookingBatchDto, BookingBatchErrorDto, \
+    BookingHoldRequest
+from sqlalchemy.ext.asyncio import AsyncSession
+from booking.mapper import db_booking_to_dto, booking_request_to_db, hold_to_dto
+from booking.exceptions import BookingNotFoundException, BookingException, BookingConflictException
 from exceptions import InconsistentDatesException, DatesException
-from db.db_user import get_user
-from db.db_hotel import get_hotel_db
 from fastapi import HTTPException, status
 from db.models import DbUser, DbHotel, DbRoom, DbBooking
 from schemas import UserBase
 from rooms.repository import RoomsRepository
+from rooms.holds import Hold, holds
 from sqlalchemy.orm import make_transient
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.exc import IntegrityError, OperationalError
+from pagination import to_ndjson_line
+
+MAX_BOOKING_ATTEMPTS = 5
 
 
 class BookingService:
-    def __init__(self, current_user: UserBase):
-        self.db = next(get_db())
+    def __init__(self, db: AsyncSession, current_user: UserBase):
+        self.db = db
         self.repository = BookingRepository(self.db)
         self.rooms_repository = RoomsRepository(self.db)
         self.current_user = current_user
 
-    def get_all(self):
-        db_bookings = self.repository.get_all()
-        result = []
-        for db_booking in db_bookings:
-            result.append(db_booking_to_dto(db_booking))
-        return result
+    async def get_all(self, after: Optional[int] = None, limit: Optional[int] = None):
+        return self.to_dtos(await self.repository.page(self.repository.get_all(), after, limit))
 
-    def get_bookings_by_username(self, username: str):
-        db_bookings = self.repository.get_bookings_by_username(username)
-        result = []
-        for db_booking in db_bookings:
-            result.append(db_booking_to_dto(db_booking))
-        return result
+    async def get_bookings_by_username(self, username: str, after: Optional[int] = None,
+                                       limit: Optional[int] = None):
+        return self.to_dtos(await self.repository.page(self.repository.get_bookings_by_username(username),
+                                                       after, limit))
+
+    async def get_bookings_by_hotels_username(self, username: str, after: Optional[int] = None,
+                                              limit: Optional[int] = None):
+        return self.to_dtos(await self.repository.page(self.repository.get_bookings_by_hotels_username(username),
+                                                       after, limit))
+
+    def stream_all(self, after: Optional[int] = None):
+        return self.stream(self.repository.get_all(), after)
 
-    def get_bookings_by_hotels_username(self, username: str):
-        db_bookings = self.repository.get_bookings_by_hotels_username(username)
+    def stream_bookings_by_username(self, username: str, after: Optional[int] = None):
+        return self.stream(self.repository.get_bookings_by_username(username), after)
+
+    def stream_bookings_by_hotels_username(self, username: str, after: Optional[int] = None):
+        return self.stream(self.repository.get_bookings_by_hotels_username(username), after)
+
+    async def stream(self, query, after: Optional[int] = None):
+        async for db_booking in self.repository.stream(query, after):
+            yield to_ndjson_line(db_booking_to_dto(db_booking))
+
+    def to_dtos(self, db_bookings):
         result = []
         for db_booking in db_bookings:
             result.append(db_booking_to_dto(db_booking))
         return result
 
-    def get_by_id(self, booking_id):
-        db_booking = self.repository.get(booking_id)
+    async def get_by_id(self, booking_id):
+        db_booking = await self.repository.get(booking_id)
         if db_booking is None:
             raise BookingNotFoundException(f"Booking with id {booking_id} not found.")
         return db_booking_to_dto(db_booking)
 
-    def add_current_user(self, booking: BookingPostRequest):
-        return self.add(booking, self.current_user)
+    async def add_current_user(self, booking: BookingPostRequest, hold_id: Optional[str] = None):
+        return await self.add(booking, self.current_user, hold_id)
+
+    async def create_for_user(self, booking: BookingPostRequest, username: str):
+        await self.check_admin()
+        user = await self.get_user(username)
+        return await self.add(booking, user)
+
+    async def get_user(self, username: str):
+        user = await self.repository.get_user(username)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Username: {username} is not found !")
+        return user
 
-    def create_for_user(self, booking: BookingPostRequest, username: str):
-        db_current_user = get_user(self.db, self.current_user.username)
+    async def check_admin(self):
+        db_current_user = await self.get_user(self.current_user.username)
         if not db_current_user.is_admin:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"User {self.current_user.username} is forbidden to book for another user"
             )
-        user = get_user(self.db, username)
-        return self.add(booking, user)
 
-    def add(self, booking: BookingPostRequest, user: UserBase):
+    async def add_batch(self, request: BookingBatchRequest, username: Optional[str] = None):
+        return await self.with_retry(lambda: self.try_add_batch(request, username))
+
+    async def try_add_batch(self, request: BookingBatchRequest, username: Optional[str] = None):
+        if username is not None and username != self.current_user.username:
+            await self.check_admin()
+        user = await self.get_user(username or self.current_user.username)
+        check_user_is_active(user)
+        bookings = request.bookings
+        if not bookings:
+            return BookingBatchDto(created=[], errors=[])
+
+        hotels = {hotel.id: hotel for hotel in await self.rooms_repository.get_hotels_by_ids(
+            {booking.hotel_id for booking in bookings})}
+        room_ids = list({booking.room_id for booking in bookings})
+        rooms = {room.id: room for room in await self.rooms_repository.get_by_ids(room_ids)}
+        occupancy = await self.rooms_repository.get_occupancy(room_ids, min(booking.checkin for booking in bookings),
+                                                        max(booking.checkout for booking in bookings))
+        new_bookings = []
+        errors = []
+        for index, booking in enumerate(bookings):
+            try:
+                check_dates(booking)
+                hotel = hotels.get(booking.hotel_id)
+                if hotel is None:
+                    raise BookingNotFoundException(f"Hotel with id '{booking.hotel_id}' not found.")
+                check_hotel_is_active(hotel)
+                room = rooms.get(booking.room_id)
+                check_room(room, booking.room_id, hotel)
+                available_count = await self.rooms_repository.claim(room, booking.checkin, booking.checkout,
+                                                                    booking.rooms_amount, occupancy, flush=False)
+                check_available_count(hotel, booking.rooms_amount, available_count)
+            except (HTTPException, BookingException, BookingNotFoundException,
+                    InconsistentDatesException, DatesException) as e:
+                errors.append(BookingBatchErrorDto(index=index, detail=getattr(e, 'message', None) or e.detail))
+                continue
+            new_bookings.append(self.repository.add(booking_request_to_db(booking, user, hotel, room)))
+
+        await self.db.flush()
+        created = self.to_dtos(new_bookings)
+        await self.db.commit()
+        return BookingBatchDto(created=created, errors=errors)
+
+    async def add(self, booking: BookingPostRequest, user: UserBase, hold_id: Optional[str] = None):
         check_dates(booking)
-        user = get_user(self.db, user.username)
+        return await self.with_retry(lambda: self.try_add(booking, user.username, hold_id))
+
+    async def try_add(self, booking: BookingPostRequest, username: str, hold_id: Optional[str] = None):
+        hold = None if hold_id is None else self.get_hold(hold_id, username)
+        if hold is not None:
+            check_booking_matches_hold(booking, hold)
+        user = await self.get_user(username)
         check_user_is_active(user)
-        hotel = self.get_hotel_by_id(booking.hotel_id)
+        hotel = await self.get_hotel_by_id(booking.hotel_id)
         check_hotel_is_active(hotel)
-        room = self.get_room(booking.room_id, hotel)
-        self.check_rooms_availability(booking)
+        room = await self.get_room(booking.room_id, hotel)
+        available_count = await self.rooms_repository.claim(room, booking.checkin, booking.checkout,
+                                                            booking.rooms_amount, check_holds=hold is None)
+        check_available_count(hotel, booking.rooms_amount, available_count)
         db_booking = booking_request_to_db(booking, user, hotel, room)
         new_booking = self.repository.add(db_booking)
-        self.db.commit()
-        self.db.refresh(new_booking)
+        await self.db.commit()
+        if hold is not None:
+            holds.remove(hold.id)
         response_dto = db_booking_to_dto(new_booking)
         return response_dto
 
-    def update(self, id: int, booking: BookingPostRequest):
-        current_booking = self.get_by_id(id)
+    async def add_hold(self, request: BookingHoldRequest):
+        check_dates(request)
+        return await self.with_retry(lambda: self.try_add_hold(request))
+
+    async def try_add_hold(self, request: BookingHoldRequest):
+        user = await self.get_user(self.current_user.username)
+        check_user_is_active(user)
+        hotel = await self.get_hotel_by_id(request.hotel_id)
+        check_hotel_is_active(hotel)
+        room = await self.get_room(request.room_id, hotel)
+        rows = await self.rooms_repository.get_occupancy([room.id], request.checkin, request.checkout)
+        available_count = self.rooms_repository.get_available_count(room, request.checkin, request.checkout, rows)
+        check_available_count(hotel, request.rooms_amount, available_count)
+        hold = holds.add(Hold(user.username, hotel.id, room.id, request.checkin, request.checkout,
+                              request.rooms_amount, request.minutes))
+        try:
+            # The count above used ledger rows read before an await; staking them fails the commit when a claim
+            # changed them since, and makes a claim that read them earlier retry and count this hold
+            await self.rooms_repository.stake(room.id, request.checkin, request.checkout, rows)
+            await self.db.commit()
+        except BaseException:
+            holds.remove(hold.id)
+            raise
+        return hold_to_dto(hold)
+
+    async def remove_hold(self, hold_id: str):
+        self.get_hold(hold_id, self.current_user.username)
+        holds.remove(hold_id)
+
+    def get_hold(self, hold_id: str, username: str):
+        hold = holds.get(hold_id)
+        if hold is None:
+            raise BookingNotFoundException(f"Hold with id {hold_id} not found or expired.")
+        if hold.username != username:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"User {self.current_user.username} is forbidden to use hold with id={hold_id}"
+            )
+        return hold
+
+    async def update(self, id: int, booking: BookingPostRequest):
         check_dates(booking)
-        current_db_booking = self.repository.get(id)
-        self.repository.remove(current_db_booking)
-        self.db.flush()
-        self.check_rooms_availability(booking)
+        return await self.with_retry(lambda: self.try_update(id, booking))
+
+    async def try_update(self, id: int, booking: BookingPostRequest):
+        current_booking = await self.get_by_id(id)
+        current_db_booking = await self.repository.get(id)
+        await self.rooms_repository.release(current_db_booking.room_id, current_db_booking.checkin,
+                                            current_db_booking.checkout, current_db_booking.rooms_amount)
+        await self.repository.remove(current_db_booking)
+        await self.db.flush()
         current_db_booking = DbBooking()
         current_db_booking.id = id
         self.check_booking_authorization(id, self.current_user.username, 'update')
-        hotel = self.get_hotel_by_id(booking.hotel_id)
+        hotel = await self.get_hotel_by_id(booking.hotel_id)
         if hotel.id != current_booking.hotel.id:
             raise BookingException(f"Cannot change hotel from '{current_booking.hotel.name} "
                                    f"id={current_booking.hotel.id}' to '{hotel.name} id={hotel.id}'")
-        room = self.get_room(booking.room_id, hotel)
+        room = await self.get_room(booking.room_id, hotel)
 
-        user = get_user(self.db, self.current_user.username)
+        available_count = await self.rooms_repository.claim(room, booking.checkin, booking.checkout,
+                                                            booking.rooms_amount)
+        check_available_count(hotel, booking.rooms_amount, available_count)
+
+        user = await self.get_user(self.current_user.username)
         booking_request_to_db(booking, user, hotel, room, current_db_booking)
         self.repository.add(current_db_booking)
-        self.db.commit()
-        self.db.refresh(current_db_booking)
+        await self.db.commit()
         return db_booking_to_dto(current_db_booking)
 
-    def remove(self, booking_id: int):
-        booking = self.get_by_id(booking_id)
+    async def remove(self, booking_id: int):
+        await self.with_retry(lambda: self.try_remove(booking_id))
+
+    async def try_remove(self, booking_id: int):
+        booking = await self.get_by_id(booking_id)
         self.check_booking_authorization(booking_id, booking.client_username, 'remove')
-        db_booking = self.repository.get(booking_id)
-        self.repository.remove(db_booking)
-        self.db.commit()
+        db_booking = await self.repository.get(booking_id)
+        await self.rooms_repository.release(db_booking.room_id, db_booking.checkin, db_booking.checkout,
+                                            db_booking.rooms_amount)
+        await self.repository.remove(db_booking)
+        await self.db.commit()
 
-    def get_hotel_by_id(self, id: int):
-        hotel = get_hotel_db(self.db, id)
+    async def get_hotel_by_id(self, id: int):
+        hotel = await self.rooms_repository.get_hotel(id)
         if hotel is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Hotel with id '{id}' not found."
+                detail=f"Could not find hotel with id: {id}"
             )
         return hotel
 
-    def check_rooms_availability(self, request: BookingPostRequest):
-        needed_rooms_amount = request.rooms_amount
-        available_count = self.rooms_repository.get_available_rooms_count(request)
-        if (available_count - needed_rooms_amount) < 0:
-            hotel = get_hotel_db(self.db, request.hotel_id)
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Hotel '{hotel.name}' doesn't have enough rooms available "
-                       f"(needed count is {needed_rooms_amount} "
-                       f"and available count is {available_count})"
-            )
+    async def with_retry(self, action):
+        # Optimistic concurrency: a conflicting writer invalidates the whole attempt, which is replayed
+        for attempt in range(1, MAX_BOOKING_ATTEMPTS + 1):
+            try:
+                return await action()
+            except (StaleDataError, IntegrityError, OperationalError) as e:
+                await self.db.rollback()
+                self.db.expunge_all()
+                if isinstance(e, OperationalError) and 'locked' not in str(e):
+                    raise
+                if attempt == MAX_BOOKING_ATTEMPTS:
+                    raise BookingConflictException("Booking could not be completed because of concurrent "
+                                                   "changes, please try again")
 
     def check_booking_authorization(self, booking_id: int, booking_usernames: list[str], action: str):
         if self.current_user.username not in booking_usernames:
@@ -135,14 +266,9 @@ class BookingService:
                 detail=f"User {self.current_user.username} is forbidden to {action} booking with id={booking_id}"
             )
 
-    def get_room(self, room_id: int, hotel: DbHotel):
-        room = self.rooms_repository.get(room_id)
-        if room is None:
-            raise BookingException(f"Room with id={room_id} not found")
-        if room.hotel_id != hotel.id:
-            raise BookingException(f"Room with id={room_id} does not belong to hotel {hotel.name} id={hotel.id}")
-        if not room.status:
-            raise BookingException(f"Room for {room.guests_count} guests in Hotel '{hotel.name}' is not available")
+    async def get_room(self, room_id: int, hotel: DbHotel):
+        room = await self.rooms_repository.get(room_id)
+        check_room(room, room_id, hotel)
         return room
 
 
@@ -156,6 +282,35 @@ def check_dates(booking: BookingPostRequest):
         raise DatesException(f"Impossible to make booking in the past ({booking.checkin} < {date.today()})")
 
 
+def check_booking_matches_hold(booking: BookingPostRequest, hold: Hold):
+    if (booking.hotel_id, booking.room_id, booking.checkin, booking.checkout) != \
+            (hold.hotel_id, hold.room_id, hold.checkin, hold.checkout) or booking.rooms_amount > hold.rooms_amount:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Booking does not match hold with id={hold.id} (room {hold.room_id} of hotel {hold.hotel_id}, "
+                   f"{hold.rooms_amount} rooms from '{hold.checkin}' to '{hold.checkout}')"
+        )
+
+
+def check_room(room: Optional[DbRoom], room_id: int, hotel: DbHotel):
+    if room is None:
+        raise BookingException(f"Room with id={room_id} not found")
+    if room.hotel_id != hotel.id:
+        raise BookingException(f"Room with id={room_id} does not belong to hotel {hotel.name} id={hotel.id}")
+    if not room.status:
+        raise BookingException(f"Room for {room.guests_count} guests in Hotel '{hotel.name}' is not available")
+
+
+def check_available_count(hotel: DbHotel, needed_rooms_amount: int, available_count: int):
+    if (available_count - needed_rooms_amount) < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Hotel '{hotel.name}' doesn't have enough rooms available "
+                   f"(needed count is {needed_rooms_amount} "
+                   f"and available count is {available_count})"
+        )
+
+
 def check_user_is_active(user: DbUser):
     if not user.is_active:
         raise BookingException(f"User '{user.username}' is not active")
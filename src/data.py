@@ -1,39 +1,121 @@
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
-from db.database import SessionLocal
-from db.models import DbUser, DbHotel, DbRoom, DbBooking
-from db.hash import Hash
+from db.database import SessionLocal, AsyncSessionLocal, engine
+from db.models import DbUser, DbHotel, DbRoom, DbBooking, DbRoomOccupancy
+from rooms.repository import RoomsRepository
+from db import db_hotel_search, models
+from db.hash import get_hash_pool, hash_password
 import datetime
+import os
 from datetime import date
 
 
-def create_admin_user():
+# off: never seed; once: seed an empty database only, later boots cost one query;
+# always: check every seed set on each boot and insert whatever is missing
+SEED_MODES = ('off', 'once', 'always')
+SEED_MODE = os.environ.get('SEED_MODE', 'once')
+
+SEED_USERS = [
+    {
+        "username": "admin",
+        "first_name": "Admin",
+        "last_name": "User",
+        "email": "admin@example.com",
+        "password": "admin123",
+        "date_of_birth": datetime.date(1990, 1, 1),
+        "gender": "other",
+        "roles": ["guest"],
+        "phone_number": "1234567890",
+        "is_active": True,
+        "profile_picture": None,
+        "is_admin": True
+    },
+    {
+        "username": "john_doe",
+        "first_name": "John",
+        "last_name": "Doe",
+        "email": "john.doe@example.com",
+        "password": "john123",
+        "date_of_birth": datetime.date(1992, 5, 15),
+        "gender": "male",
+        "roles": ["guest"],
+        "phone_number": "5551234567",
+        "is_active": True,
+        "profile_picture": None,
+        "is_admin": False
+    },
+    {
+        "username": "jane_smith",
+        "first_name": "Jane",
+        "last_name": "Smith",
+        "email": "jane.smith@example.com",
+        "password": "jane123",
+        "date_of_birth": datetime.date(1995, 8, 22),
+        "gender": "female",
+        "roles": ["guest"],
+        "phone_number": "5559876543",
+        "is_active": True,
+        "profile_picture": None,
+        "is_admin": False
+    },
+    {
+        "username": "alex_jones",
+        "first_name": "Alex",
+        "last_name": "Jones",
+        "email": "alex.jones@example.com",
+        "password": "alex123",
+        "date_of_birth": datetime.date(1990, 12, 1),
+        "gender": "other",
+        "roles": ["guest"],
+        "phone_number": "5557654321",
+        "is_active": True,
+        "profile_picture": None,
+        "is_admin": False
+    }
+]
+
+
+def create_tables():
+    models.Base.metadata.create_all(engine)
+
+
+def seed_database():
+    if SEED_MODE not in SEED_MODES:
+        raise ValueError(f"SEED_MODE must be one of {', '.join(SEED_MODES)}, not '{SEED_MODE}'")
+    if SEED_MODE == 'off':
+        return
+    if SEED_MODE == 'once' and is_seeded():
+        print("Database is already seeded.")
+        return
+    create_users()
+    create_hotel()
+    create_dummy_bookings()
+
+
+def is_seeded() -> bool:
+    with SessionLocal() as db:
+        return db.scalar(select(DbUser.id).limit(1)) is not None
+
+
+def create_users():
     db: Session = SessionLocal()
     try:
-        admin_user = db.query(DbUser).filter(DbUser.username == 'admin').first()
-        if admin_user:
-            print("Admin user already exists.")
+        usernames = [user_data["username"] for user_data in SEED_USERS]
+        existing = set(db.scalars(select(DbUser.username).where(DbUser.username.in_(usernames))))
+        for username in existing:
+            print(f"User {username} already exists.")
+        new_users = [user_data for user_data in SEED_USERS if user_data["username"] not in existing]
+        if not new_users:
             return
-        new_admin = DbUser(
-            username='admin',
-            first_name='Admin',
-            last_name='User',
-            email='admin@example.com',
-            password=Hash.bcrypt("admin123"),
-            date_of_birth=datetime.date(1990, 1, 1),
-            gender='other',
-            roles=['guest'],
-            phone_number='1234567890',
-            is_active=True,
-            profile_picture=None,
-            is_admin=True
-        )
 
-        db.add(new_admin)
+        # only the users actually inserted are hashed, in parallel on the hash pool
+        passwords = get_hash_pool().map(hash_password, [user_data["password"] for user_data in new_users])
+        db.execute(insert(DbUser), [{**user_data, "password": password}
+                                    for user_data, password in zip(new_users, passwords)])
         db.commit()
-        db.refresh(new_admin)
-        print("Admin user created successfully.")
+        print(f"Users {', '.join(user_data['username'] for user_data in new_users)} created successfully.")
     except Exception as e:
-        print(f"An error occurred while creating admin user: {e}")
+        print(f"An error occurred while creating users: {e}")
     finally:
         db.close()
 
@@ -42,7 +124,7 @@ def create_hotel():
     db: Session = SessionLocal()
     try:
         # Check if hotel already exists
-        hotel = db.query(DbHotel).filter(DbHotel.name == 'HotelOne').first()
+        hotel = db.scalar(select(DbHotel.id).where(DbHotel.name.in_(['HotelOne', 'HotelTwo'])).limit(1))
         if hotel:
             print("Hotel already exists.")
             return
@@ -50,7 +132,7 @@ def create_hotel():
         # Create new hotel
         new_hotel = DbHotel(
             name='HotelOne',
-            city='Amsterdam',
+            city='amsterdam',
             address="'s-Gravenhekje 1A",
             description='Test hotel',
             user_id=3,  # Assuming user_id is available and valid
@@ -61,7 +143,7 @@ def create_hotel():
 
         new_hotel_two = DbHotel(
             name='HotelTwo',
-            city='Amsterdam',
+            city='amsterdam',
             address="'s-Gravenhekje 1A",
             description='Test hotel',
             user_id=3,  # Assuming user_id is available and valid
@@ -70,10 +152,8 @@ def create_hotel():
             phone_number='123456789'
         )
 
-        db.add(new_hotel)
-        db.add(new_hotel_two)
-        db.commit()
-        db.refresh(new_hotel)
+        db.add_all([new_hotel, new_hotel_two])
+        db.flush()
 
         # Create associated rooms for the new hotel
         rooms = [
@@ -83,9 +163,7 @@ def create_hotel():
             DbRoom(rooms_amount=5, guests_count=4, status=False, hotel_id=new_hotel.id)
         ]
 
-        for room in rooms:
-            db.add(room)
-
+        db.add_all(rooms)
         db.commit()
 
         print("Hotel and associated rooms created successfully.")
@@ -101,7 +179,7 @@ def create_dummy_bookings():
     db: Session = SessionLocal()
     try:
 
-        booking = db.query(DbBooking).filter(DbBooking.additional_info == 'Early check-in requested').first()
+        booking = db.scalar(select(DbBooking.id).where(DbBooking.additional_info == 'Early check-in requested'))
         if booking:
             print("Booking already exists.")
             return
@@ -132,10 +210,7 @@ def create_dummy_bookings():
             )
         ]
 
-        # Add bookings to the session and commit
-        for booking in bookings:
-            db.add(booking)
-
+        db.add_all(bookings)
         db.commit()
         print("Dummy bookings created successfully.")
 
@@ -146,82 +221,28 @@ def create_dummy_bookings():
         db.close()
 
 
-def create_dummy_users():
+def create_hotel_search_table():
     db: Session = SessionLocal()
     try:
-        dummy_users = [
-            {
-                "username": "john_doe",
-                "first_name": "John",
-                "last_name": "Doe",
-                "email": "john.doe@example.com",
-                "password": Hash.bcrypt("john123"),
-                "date_of_birth": datetime.date(1992, 5, 15),
-                "gender": "male",
-                "roles": ["guest"],
-                "phone_number": "5551234567",
-                "is_active": True,
-                "profile_picture": None,
-                "is_admin": False
-            },
-            {
-                "username": "jane_smith",
-                "first_name": "Jane",
-                "last_name": "Smith",
-                "email": "jane.smith@example.com",
-                "password": Hash.bcrypt("jane123"),
-                "date_of_birth": datetime.date(1995, 8, 22),
-                "gender": "female",
-                "roles": ["guest"],
-                "phone_number": "5559876543",
-                "is_active": True,
-                "profile_picture": None,
-                "is_admin": False
-            },
-            {
-                "username": "alex_jones",
-                "first_name": "Alex",
-                "last_name": "Jones",
-                "email": "alex.jones@example.com",
-                "password": Hash.bcrypt("alex123"),
-                "date_of_birth": datetime.date(1990, 12, 1),
-                "gender": "other",
-                "roles": ["guest"],
-                "phone_number": "5557654321",
-                "is_active": True,
-                "profile_picture": None,
-                "is_admin": False
-            }
-        ]
-
-        for user_data in dummy_users:
-
-            existing_user = db.query(DbUser).filter(DbUser.username == user_data["username"]).first()
-            if existing_user:
-                print(f"User {user_data['username']} already exists.")
-                continue
-
-            new_user = DbUser(
-                username=user_data["username"],
-                first_name=user_data["first_name"],
-                last_name=user_data["last_name"],
-                email=user_data["email"],
-                password=user_data["password"],
-                date_of_birth=user_data["date_of_birth"],
-                gender=user_data["gender"],
-                roles=user_data["roles"],
-                phone_number=user_data["phone_number"],
-                is_active=user_data["is_active"],
-                profile_picture=user_data["profile_picture"],
-                is_admin=user_data["is_admin"]
-            )
-
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
-            print(f"User {user_data['username']} created successfully.")
-
+        db_hotel_search.create_search_table(db)
+        print("Hotel search table is ready.")
     except Exception as e:
-        print(f"An error occurred while creating dummy users: {e}")
+        print(f"An error occurred while creating hotel search table: {e}")
     finally:
         db.close()
+
+
+async def create_room_occupancy():
+    async with AsyncSessionLocal() as db:
+        try:
+            occupancy = await db.scalar(select(DbRoomOccupancy).limit(1))
+            if occupancy:
+                print("Room occupancy already exists.")
+                return
+
+            await RoomsRepository(db).rebuild_occupancy()
+            await db.commit()
+            print("Room occupancy created successfully.")
+
+        except Exception as e:
+            print(f"An error occurred while creating room occupancy: {e}")
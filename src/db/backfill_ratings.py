@@ -0,0 +1,50 @@
+"""Fill hotels.rating_sum, hotels.rating_count and hotels.score from the ratings table.
+
+Run once from src/ after upgrading an existing database: python -m db.backfill_ratings
+"""
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.orm import Session
+from db.database import SessionLocal, engine
+from db.models import DbHotel, DbRating
+from db.db_rating import bayesian_score
+
+HOTEL_COLUMNS = {
+    'rating_sum': 'INTEGER NOT NULL DEFAULT 0',
+    'rating_count': 'INTEGER NOT NULL DEFAULT 0',
+    'score': 'FLOAT NOT NULL DEFAULT 3.0'
+}
+
+
+def add_missing_columns():
+    # create_all never alters existing tables, so databases created before the columns existed get them here
+    columns = {column['name'] for column in inspect(engine).get_columns(DbHotel.__tablename__)}
+    with engine.begin() as connection:
+        for name, definition in HOTEL_COLUMNS.items():
+            if name not in columns:
+                connection.execute(text(f"ALTER TABLE {DbHotel.__tablename__} ADD COLUMN {name} {definition}"))
+
+
+def add_missing_indexes():
+    for table in (DbHotel.__table__, DbRating.__table__):
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def backfill_hotel_ratings(db: Session):
+    ratings = select(DbRating).where(DbRating.hotel_id == DbHotel.id)
+    rating_sum = ratings.with_only_columns(func.coalesce(func.sum(DbRating.rating_score), 0)).scalar_subquery()
+    rating_count = ratings.with_only_columns(func.count(DbRating.id)).scalar_subquery()
+    result = db.execute(update(DbHotel).values(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        score=bayesian_score(rating_sum, rating_count)
+    ))
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == '__main__':
+    add_missing_columns()
+    add_missing_indexes()
+    with SessionLocal() as session:
+        print(f"Rating aggregates of {backfill_hotel_ratings(session)} hotels are updated")
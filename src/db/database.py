@@ -1,13 +1,20 @@
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
  
 SQLALCHEMY_DATABASE_URL = "sqlite:///./db/Pybooking.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./db/Pybooking.db"
  
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+# objects stay usable after commit, an expired attribute would need a lazy load which async sessions can't do
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
  
 Base = declarative_base()
 
@@ -17,3 +24,36 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+pool_counters = {'checkouts': 0, 'checkins': 0}
+pool_counters_lock = threading.Lock()
+
+
+@event.listens_for(engine, 'checkout')
+@event.listens_for(async_engine.sync_engine, 'checkout')
+def count_checkout(dbapi_connection, connection_record, connection_proxy):
+    with pool_counters_lock:
+        pool_counters['checkouts'] += 1
+
+
+@event.listens_for(engine, 'checkin')
+@event.listens_for(async_engine.sync_engine, 'checkin')
+def count_checkin(dbapi_connection, connection_record):
+    with pool_counters_lock:
+        pool_counters['checkins'] += 1
+
+
+def get_pool_stats():
+    # checked_out that keeps growing between scrapes means sessions are not being closed
+    with pool_counters_lock:
+        stats = dict(pool_counters)
+    stats['checked_out'] = stats['checkouts'] - stats['checkins']
+    stats['pool_status'] = engine.pool.status()
+    stats['async_pool_status'] = async_engine.pool.status()
+    return stats
@@ -0,0 +1,71 @@
+from typing import Dict
+from sqlalchemy import select, delete, update, func, or_
+from sqlalchemy.orm import Session
+from db.models import DbUser, DbHotel, DbRoom, DbBooking, DbRating, DbRoomOccupancy
+from db.db_hotel_search import search_table
+from db.db_rating import bayesian_score
+
+# Every statement below is a single set-based DELETE/UPDATE over id subqueries, in dependency order
+# (ratings -> occupancy -> bookings -> rooms -> hotels); callers commit, so the whole graph goes in one transaction
+
+
+def run(db: Session, statement) -> int:
+    return db.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+
+def delete_hotels(db: Session, hotel_ids) -> Dict[str, int]:
+    room_ids = select(DbRoom.id).where(DbRoom.hotel_id.in_(hotel_ids))
+    counts = {
+        'ratings': run(db, delete(DbRating).where(DbRating.hotel_id.in_(hotel_ids))),
+        'room_occupancy': run(db, delete(DbRoomOccupancy).where(DbRoomOccupancy.room_id.in_(room_ids))),
+        'bookings': run(db, delete(DbBooking).where(DbBooking.hotel_id.in_(hotel_ids))),
+        'rooms': run(db, delete(DbRoom).where(DbRoom.hotel_id.in_(hotel_ids)))
+    }
+    db.execute(delete(search_table).where(search_table.c.rowid.in_(hotel_ids)))
+    counts['hotels'] = run(db, delete(DbHotel).where(DbHotel.id.in_(hotel_ids)))
+    return counts
+
+
+def release_bookings(db: Session, booking_ids) -> int:
+    # takes the bookings' rooms back from the occupancy ledger; the version bump makes concurrent claims retry
+    released = (select(func.coalesce(func.sum(DbBooking.rooms_amount), 0))
+                .where(DbBooking.id.in_(booking_ids))
+                .where(DbBooking.room_id == DbRoomOccupancy.room_id)
+                .where(DbBooking.checkin <= DbRoomOccupancy.day)
+                .where(DbBooking.checkout > DbRoomOccupancy.day)
+                .scalar_subquery())
+    run(db, update(DbRoomOccupancy)
+        .where(DbRoomOccupancy.room_id.in_(select(DbBooking.room_id).where(DbBooking.id.in_(booking_ids))))
+        .values(rooms_taken=DbRoomOccupancy.rooms_taken - released, version=DbRoomOccupancy.version + 1))
+    return run(db, delete(DbRoomOccupancy).where(DbRoomOccupancy.rooms_taken <= 0))
+
+
+def remove_hotels_ratings(db: Session, ratings, hotel_ids):
+    # takes the ratings out of the aggregates of the hotels that stay, one grouped UPDATE ... FROM for all of them
+    removed = (select(DbRating.hotel_id, func.sum(DbRating.rating_score).label('rating_sum'),
+                      func.count(DbRating.id).label('rating_count'))
+               .where(ratings).where(DbRating.hotel_id.not_in(hotel_ids))
+               .group_by(DbRating.hotel_id).subquery())
+    rating_sum = DbHotel.rating_sum - removed.c.rating_sum
+    rating_count = DbHotel.rating_count - removed.c.rating_count
+    run(db, update(DbHotel).where(DbHotel.id == removed.c.hotel_id)
+        .values(rating_sum=rating_sum, rating_count=rating_count, score=bayesian_score(rating_sum, rating_count)))
+
+
+def delete_user(db: Session, user_id: int) -> Dict[str, int]:
+    hotel_ids = select(DbHotel.id).where(DbHotel.user_id == user_id)
+    # bookings of the user in other owners' hotels; the ones in the user's own hotels go with the hotels
+    booking_ids = (select(DbBooking.id).where(DbBooking.client_id == user_id)
+                   .where(DbBooking.hotel_id.not_in(hotel_ids)))
+    ratings = or_(DbRating.user_id == user_id, DbRating.booking_id.in_(booking_ids))
+    remove_hotels_ratings(db, ratings, hotel_ids)
+    ratings_count = run(db, delete(DbRating).where(ratings))
+    occupancy_count = release_bookings(db, booking_ids)
+    bookings_count = run(db, delete(DbBooking).where(DbBooking.id.in_(booking_ids)))
+    run(db, update(DbBooking).where(DbBooking.last_modifier_user_id == user_id).values(last_modifier_user_id=None))
+    counts = delete_hotels(db, hotel_ids)
+    counts['ratings'] += ratings_count
+    counts['bookings'] += bookings_count
+    counts['room_occupancy'] += occupancy_count
+    counts['users'] = run(db, delete(DbUser).where(DbUser.id == user_id))
+    return counts
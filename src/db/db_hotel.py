@@ -1,18 +1,48 @@
-from sqlalchemy.orm import Session
-from db.models import DbHotel, DbRating
-from schemas import HotelBase, HotelDisplay, RatingBase
+from collections import defaultdict
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, selectinload
+from typing import Optional
+from db.models import DbHotel, DbRating, DbUser
+from schemas import HotelBase, HotelDisplay, RatingBase, IncludeRatingsEnum
 from fastapi import HTTPException, status
+from db import db_hotel_search, db_deletion
+from response_cache import hotel_cache, hotel_tag, LISTING_TAG
 
-def calculate_average_rating(hotel_ratings):
-    if hotel_ratings:
-        total_score = sum([rating.rating_score for rating in hotel_ratings])
-        average_rating = total_score / len(hotel_ratings)
+DEFAULT_RATINGS_LIMIT = 10
+MAX_RATINGS_LIMIT = 100
+
+def format_average_rating(hotel):
+    if hotel.rating_count:
+        average_rating = hotel.rating_sum / hotel.rating_count
         return f"{str(round(average_rating, 1))}/5"
     return "No ratings yet"
 
 
-def hotel_to_display(hotel):
-    rating_str = calculate_average_rating(hotel.ratings)
+def get_hotels_ratings(db: Session, hotel_ids, include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.latest,
+                       ratings_limit: int = DEFAULT_RATINGS_LIMIT):
+    hotels_ratings = defaultdict(list)
+    if include_ratings == IncludeRatingsEnum.none or not hotel_ids:
+        return hotels_ratings
+    query = db.query(DbRating).filter(DbRating.hotel_id.in_(hotel_ids))
+    if include_ratings == IncludeRatingsEnum.latest:
+        # numbers each hotel's ratings newest first, so one query returns at most ratings_limit per hotel
+        position = func.row_number().over(partition_by=DbRating.hotel_id,
+                                          order_by=(DbRating.rating_date.desc(), DbRating.id.desc())).label('position')
+        ranked = db.query(DbRating.id, position).filter(DbRating.hotel_id.in_(hotel_ids)).subquery()
+        query = query.join(ranked, ranked.c.id == DbRating.id).filter(ranked.c.position <= ratings_limit)
+    for rating in query.order_by(DbRating.rating_date.desc(), DbRating.id.desc()):
+        hotels_ratings[rating.hotel_id].append(rating)
+    return hotels_ratings
+
+
+def hotels_to_display(db: Session, hotels, include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.latest,
+                      ratings_limit: int = DEFAULT_RATINGS_LIMIT):
+    hotels_ratings = get_hotels_ratings(db, [hotel.id for hotel in hotels], include_ratings, ratings_limit)
+    return [hotel_to_display(hotel, hotels_ratings[hotel.id]) for hotel in hotels]
+
+
+def hotel_to_display(hotel, ratings=()):
+    rating_str = format_average_rating(hotel)
     return HotelDisplay(
         id=hotel.id,
         name=hotel.name,
@@ -24,7 +54,7 @@ def hotel_to_display(hotel):
         description=hotel.description,
         available=hotel.available,
         owner=hotel.owner,
-        ratings=hotel.ratings
+        ratings=ratings
     )
 
 def create_hotel(db: Session, request: HotelBase, current_user):
@@ -57,7 +87,10 @@ def create_hotel(db: Session, request: HotelBase, current_user):
         )
     
     db.add(new_hotel)
+    db.flush()
+    db_hotel_search.index_hotel(db, new_hotel)
     db.commit()
+    hotel_cache.invalidate(LISTING_TAG)
     db.refresh(new_hotel)
     return hotel_to_display(new_hotel)
 
@@ -69,20 +102,54 @@ def get_hotel_db(db: Session, id: int):
         raise HTTPException(status_code= status.HTTP_404_NOT_FOUND , detail=f'Could not find hotel with id: {id}')
     return hotel
 
-def get_hotel(db: Session, id: int):
+def get_hotel(db: Session, id: int, include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.latest,
+              ratings_limit: int = DEFAULT_RATINGS_LIMIT):
     hotel = get_hotel_db(db, id)
-    hotel.rating = calculate_average_rating(hotel.ratings)
-    return hotel_to_display(hotel)
+    return hotels_to_display(db, [hotel], include_ratings, ratings_limit)[0]
 
 
-def get_all_hotels(db: Session):
-    hotels = db.query(DbHotel).all()
-    if not hotels:
+def get_all_hotels(db: Session, city: Optional[str] = None, available: Optional[bool] = None,
+                   min_rating: Optional[float] = None, owner: Optional[str] = None,
+                   after: Optional[int] = None, limit: Optional[int] = None,
+                   include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.latest,
+                   ratings_limit: int = DEFAULT_RATINGS_LIMIT):
+    query = db.query(DbHotel).options(selectinload(DbHotel.owner))
+    if city is not None:
+        query = query.filter(DbHotel.city == city.lower())
+    if available is not None:
+        query = query.filter(DbHotel.available == available)
+    if min_rating is not None:
+        # compares sum >= min * count so the filter stays on the hotel row without dividing
+        query = query.filter(DbHotel.rating_count > 0, DbHotel.rating_sum >= min_rating * DbHotel.rating_count)
+    if owner is not None:
+        query = query.join(DbHotel.owner).filter(DbUser.username == owner)
+    if after is not None:
+        query = query.filter(DbHotel.id > after)
+    hotels = query.order_by(DbHotel.id).limit(limit).all()
+    if not hotels and after is None:
         raise HTTPException(status_code= status.HTTP_404_NOT_FOUND , detail=f'Could not find any hotels.')
 
-    for hotel in hotels:
-        hotel.rating = calculate_average_rating(hotel.ratings)
-    return hotels
+    return hotels_to_display(db, hotels, include_ratings, ratings_limit)
+
+
+def get_top_hotels(db: Session, city: str, limit: int,
+                   include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.latest,
+                   ratings_limit: int = DEFAULT_RATINGS_LIMIT):
+    # a backwards range read of the (city, score) index; unavailable hotels are skipped as they come
+    hotels = db.query(DbHotel).options(selectinload(DbHotel.owner))\
+        .filter(DbHotel.city == city.lower(), DbHotel.available == True)\
+        .order_by(DbHotel.score.desc(), DbHotel.id.desc()).limit(limit).all()
+    return hotels_to_display(db, hotels, include_ratings, ratings_limit)
+
+
+def search_hotels(db: Session, search: str, after: Optional[str] = None, limit: Optional[int] = None,
+                  include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.latest,
+                  ratings_limit: int = DEFAULT_RATINGS_LIMIT):
+    matches = db_hotel_search.search_hotels(db, search, after, limit)
+    hotels = {hotel.id: hotel for hotel in db.query(DbHotel).options(selectinload(DbHotel.owner))
+              .filter(DbHotel.id.in_([hotel_id for hotel_id, _ in matches]))}
+    return matches, hotels_to_display(db, [hotels[hotel_id] for hotel_id, _ in matches], include_ratings,
+                                      ratings_limit)
 
 
 # update hotel
@@ -97,8 +164,6 @@ def update_hotel(db: Session, id: int, request: HotelBase, current_user):
     hotel.phone_number = request.phone_number
     hotel.description = request.description
     hotel.available = request.available
-    hotel_ratings = hotel.ratings
-    hotel.rating = calculate_average_rating(hotel_ratings) 
 
     if not request.name.strip():
         raise HTTPException(
@@ -124,13 +189,15 @@ def update_hotel(db: Session, id: int, request: HotelBase, current_user):
             detail="You are not allowed to update this hotel."
         )
     
+    db_hotel_search.index_hotel(db, hotel)
     db.commit()
+    hotel_cache.invalidate(hotel_tag(id), LISTING_TAG)
     db.refresh(hotel)
-    return hotel_to_display(hotel)
+    return hotels_to_display(db, [hotel])[0]
 
 # delete hotel
 def delete_hotel(db:Session, id:int,current_user):
-    """Delete hotel and associated ratings"""
+    """Delete hotel with its ratings, bookings and rooms"""
     hotel= db.query(DbHotel).filter(DbHotel.id == id).first()
     if hotel is None:
         raise HTTPException(status_code= status.HTTP_404_NOT_FOUND , detail=f'Could not find hotel with id: {id}')
@@ -145,7 +212,7 @@ def delete_hotel(db:Session, id:int,current_user):
         hotel_name = hotel.name
     except:
         raise HTTPException(status_code= status.HTTP_404_NOT_FOUND , detail=f'Could not find owner of hotel with id: {id}')
-    db.query(DbRating).filter(DbRating.hotel_id == id).delete()
-    db.delete(hotel)
+    deleted = db_deletion.delete_hotels(db, select(DbHotel.id).where(DbHotel.id == id))
     db.commit()
-    return {"detail": f"Hotel: {hotel_name} and associated ratings are deleted!"}
\ No newline at end of file
+    hotel_cache.invalidate(hotel_tag(id), LISTING_TAG)
+    return {"detail": f"Hotel: {hotel_name} and associated ratings, bookings and rooms are deleted!", "deleted": deleted}
\ No newline at end of file
@@ -0,0 +1,71 @@
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import text, table, column
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from db.models import DbHotel
+
+SEARCH_TABLE = 'hotels_fts'
+# bm25 weights of the name, city, address and description columns
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+CURSOR_SEPARATOR = '_'
+search_table = table(SEARCH_TABLE, column('rowid'))
+
+
+def create_search_table(db: Session):
+    # FTS5 tables are not part of the models metadata, the rowid of an entry is the hotel id
+    db.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                    f"name, city, address, description, tokenize = 'unicode61 remove_diacritics 2')"))
+    if db.execute(text(f"SELECT rowid FROM {SEARCH_TABLE} LIMIT 1")).first() is None:
+        rebuild_search_table(db)
+    db.commit()
+
+
+def rebuild_search_table(db: Session):
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    db.execute(text(f"INSERT INTO {SEARCH_TABLE} (rowid, name, city, address, description) "
+                    f"SELECT id, name, city, address, description FROM {DbHotel.__tablename__}"))
+
+
+def index_hotel(db: Session, hotel: DbHotel):
+    remove_hotel(db, hotel.id)
+    db.execute(text(f"INSERT INTO {SEARCH_TABLE} (rowid, name, city, address, description) "
+                    f"VALUES (:id, :name, :city, :address, :description)"),
+               {'id': hotel.id, 'name': hotel.name, 'city': hotel.city, 'address': hotel.address,
+                'description': hotel.description})
+
+
+def remove_hotel(db: Session, hotel_id: int):
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id"), {'id': hotel_id})
+
+
+def to_match_query(search: str) -> str:
+    # every word is quoted, so user input is never parsed as FTS5 query syntax; words are AND-ed
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', search))
+
+
+def parse_cursor(after: str) -> Tuple[float, int]:
+    try:
+        score, hotel_id = after.rsplit(CURSOR_SEPARATOR, 1)
+        return float(score), int(hotel_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid search cursor: {after}")
+
+
+def to_cursor(hotel_id: int, score: float) -> str:
+    return f"{score!r}{CURSOR_SEPARATOR}{hotel_id}"
+
+
+def search_hotels(db: Session, search: str, after: Optional[str] = None,
+                  limit: int = 100) -> List[Tuple[int, float]]:
+    # (hotel id, bm25 score) of the matches, best (lowest) score first, paginated by the (score, id) cursor
+    match_query = to_match_query(search)
+    if not match_query:
+        return []
+    score, hotel_id = parse_cursor(after) if after is not None else (float('-inf'), 0)
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    return [tuple(row) for row in db.execute(text(
+        f"SELECT id, score FROM (SELECT rowid AS id, bm25({SEARCH_TABLE}, {weights}) AS score "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :query) "
+        f"WHERE (score, id) > (:score, :id) ORDER BY score, id LIMIT :limit"),
+        {'query': match_query, 'score': score, 'id': hotel_id, 'limit': limit})]
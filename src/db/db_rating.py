@@ -1,9 +1,28 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from db.models import DbRating, DbBooking, DbHotel
-from schemas import RatingBase
+from schemas import RatingBase, RatingSummaryDisplay
 from fastapi import HTTPException, status
-from datetime import datetime
-from sqlalchemy import func
+from datetime import datetime, date
+from sqlalchemy import func, tuple_
+from typing import Optional
+from response_cache import hotel_cache, hotel_tag, LISTING_TAG
+
+
+# every hotel starts as if it had PRIOR_WEIGHT ratings of PRIOR_MEAN, so a few 5-star ratings don't top the ranking
+PRIOR_MEAN = 3.0
+PRIOR_WEIGHT = 10
+
+def bayesian_score(rating_sum, rating_count):
+    return (PRIOR_MEAN * PRIOR_WEIGHT + rating_sum) / (PRIOR_WEIGHT + rating_count)
+
+def change_hotel_rating(db: Session, hotel_id: int, score_delta: int, count_delta: int):
+    # incremented in SQL within the rating's transaction, so concurrent raters never overwrite each other
+    rating_sum = DbHotel.rating_sum + score_delta
+    rating_count = DbHotel.rating_count + count_delta
+    db.query(DbHotel).filter(DbHotel.id == hotel_id).update(
+        {DbHotel.rating_sum: rating_sum, DbHotel.rating_count: rating_count,
+         DbHotel.score: bayesian_score(rating_sum, rating_count)},
+        synchronize_session=False)
 
 def create_rating(db: Session, request: RatingBase, booking_id: int, current_user):
     booking = db.query(DbBooking).filter(DbBooking.id == booking_id).first()
@@ -36,7 +55,9 @@ def create_rating(db: Session, request: RatingBase, booking_id: int, current_use
     
     
     db.add(new_rating)
+    change_hotel_rating(db, hotel.id, new_rating.rating_score, 1)
     db.commit()
+    hotel_cache.invalidate(hotel_tag(hotel.id), LISTING_TAG)
     db.refresh(new_rating)
     return new_rating
 
@@ -48,13 +69,35 @@ def get_rating_by_id(db: Session , rating_id: int):
     
     return rating
 
-def get_ratings_by_hotel_id(db: Session, hotel_id:int):
-    ratings = db.query(DbRating).filter(DbRating.hotel_id == hotel_id).all()
-    if not ratings:
+def rating_cursor(rating: DbRating):
+    return f"{rating.rating_date.isoformat()}_{rating.id}"
+
+def parse_rating_cursor(after: str):
+    try:
+        rating_date, rating_id = after.split("_")
+        return date.fromisoformat(rating_date), int(rating_id)
+    except ValueError:
+        raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail= f"Invalid ratings cursor: {after}")
+
+def get_ratings_by_hotel_id(db: Session, hotel_id:int, after: Optional[str] = None, limit: Optional[int] = None):
+    # newest first; (hotel_id, rating_date) index plus the rowid serves both the filter and the keyset order
+    query = db.query(DbRating).options(joinedload(DbRating.rated_hotel), joinedload(DbRating.rated_booking))\
+        .filter(DbRating.hotel_id == hotel_id)
+    if after is not None:
+        query = query.filter(tuple_(DbRating.rating_date, DbRating.id) < parse_rating_cursor(after))
+    ratings = query.order_by(DbRating.rating_date.desc(), DbRating.id.desc()).limit(limit).all()
+    if not ratings and after is None:
         raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail= f"No ratings found for hotel with id {hotel_id}.")
     
     return ratings
 
+def get_rating_summary(db: Session, hotel_id: int):
+    histogram = {score: 0 for score in range(1, 6)}
+    for score, count in db.query(DbRating.rating_score, func.count(DbRating.id))\
+            .filter(DbRating.hotel_id == hotel_id).group_by(DbRating.rating_score):
+        histogram[score] = count
+    return RatingSummaryDisplay(hotel_id=hotel_id, count=sum(histogram.values()), histogram=histogram)
+
 def update_rating(db:Session, rating_id:int, request: RatingBase,current_user):
     rating = db.query(DbRating).filter(DbRating.id == rating_id).first()
 
@@ -77,10 +120,12 @@ def update_rating(db:Session, rating_id:int, request: RatingBase,current_user):
     
     
 
+    change_hotel_rating(db, rating.hotel_id, request.rating_score - rating.rating_score, 0)
     rating.rating_score = request.rating_score
     rating.title = request.title
     rating.comment = request.comment
     db.commit()
+    hotel_cache.invalidate(hotel_tag(rating.hotel_id), LISTING_TAG)
     db.refresh(rating)
     return rating
 
@@ -99,6 +144,8 @@ def delete_rating(db:Session, rating_id:int, current_user):
     if booking.client_id != current_user.id:
         raise HTTPException(status_code= status.HTTP_403_FORBIDDEN, detail="You are not allowed to delete this rating.")
     
+    change_hotel_rating(db, rating.hotel_id, -rating.rating_score, -1)
     db.delete(rating)
     db.commit()
+    hotel_cache.invalidate(hotel_tag(rating.hotel_id), LISTING_TAG)
     return f"Rating with id {rating_id} has been deleted."
\ No newline at end of file
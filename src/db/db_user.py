@@ -1,12 +1,16 @@
 from sqlalchemy.orm.session import Session
-from schemas import UserBase
+from schemas import UserBase, UserDisplay, Hotel
 from db.models import DbUser, DbHotel
 from db.hash import Hash
 from fastapi import HTTPException, status
 from datetime import date
-import shutil
-from datetime import datetime
+from collections import defaultdict
+from typing import Optional
 from exception.user import get_admin_exception, get_credentials_exception
+from response_cache import hotel_cache
+from auth.user_cache import user_cache
+from db import db_deletion
+import profile_pictures
 
 def calculate_age(date_of_birth: date) -> int:
     today = date.today()
@@ -18,27 +22,48 @@ def check_current_user(current_user):
         raise get_credentials_exception()
 
 
-def get_all_user(db : Session, current_user: DbUser, usernameFilter, is_admin_filter):
+# only the columns UserDisplay shows, so listings never load passwords or relationships
+USER_DISPLAY_COLUMNS = (DbUser.id, DbUser.username, DbUser.email, DbUser.first_name, DbUser.last_name,
+                        DbUser.date_of_birth, DbUser.gender, DbUser.profile_picture)
 
-    users = db.query(DbUser)
-    
+
+def get_all_user(db : Session, current_user: DbUser, usernameFilter, is_admin_filter,
+                 after: Optional[int] = None, limit: Optional[int] = None, include_hotels: bool = True):
+
+    if usernameFilter is None and not current_user.is_admin:
+        raise get_admin_exception()
+    if is_admin_filter is not None and not current_user.is_admin:
+        raise get_admin_exception()
+
+    query = db.query(*USER_DISPLAY_COLUMNS)
     if usernameFilter is not None:
-        users = users.filter(DbUser.username == usernameFilter)
-        if not users.first():
+        query = query.filter(DbUser.username == usernameFilter)
+    if is_admin_filter is not None:
+        query = query.filter(DbUser.is_admin == is_admin_filter)
+    if after is not None:
+        query = query.filter(DbUser.id > after)
+    users = query.order_by(DbUser.id).limit(limit).all()
+
+    if not users and after is None:
+        if usernameFilter is not None:
             raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail= f"Username: {usernameFilter} is not found!")
-        elif users.first().username != current_user.username and not current_user.is_admin:
-            raise get_admin_exception()
-    elif usernameFilter is None and  not current_user.is_admin:
+        if is_admin_filter is not None:
+            raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail= f"User admin: {is_admin_filter} is not found, use true or false!")
+    if usernameFilter is not None and usernameFilter != current_user.username and not current_user.is_admin:
         raise get_admin_exception()
 
-    if is_admin_filter is not None and current_user.is_admin:
-        users = users.filter(DbUser.is_admin == is_admin_filter)
-        if not users.first():
-            raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail= f"User admin: {is_admin_filter} is not found, use true or false!")
-    elif is_admin_filter is not None and not current_user.is_admin:
-            raise get_admin_exception()
+    users_hotels = get_users_hotels(db, [user.id for user in users]) if include_hotels else defaultdict(list)
+    return [UserDisplay(**user._mapping, hotels=users_hotels[user.id]) for user in users]
 
-    return users.all()
+def get_users_hotels(db : Session, user_ids):
+    # one query for the hotels of the whole page instead of a lazy load per user
+    users_hotels = defaultdict(list)
+    if not user_ids:
+        return users_hotels
+    for hotel in db.query(DbHotel.id, DbHotel.name, DbHotel.address, DbHotel.city, DbHotel.user_id)\
+            .filter(DbHotel.user_id.in_(user_ids)).order_by(DbHotel.id):
+        users_hotels[hotel.user_id].append(Hotel.model_validate(hotel))
+    return users_hotels
 
 def get_user_by_id(db : Session, id: int, current_user: DbUser):
 
@@ -53,40 +78,17 @@ def get_user_by_id(db : Session, id: int, current_user: DbUser):
      
     return user
 
-def upload_file(upload_file, db : Session, current_user):
-
-    if upload_file.filename:
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        path = f'files/{timestamp}_{upload_file.filename}'
-        with open(path, 'w+b') as buffer:
-            shutil.copyfileobj(upload_file.file, buffer)
-        current_user.profile_picture = path
-    else: 
-        raise HTTPException(status_code=400, detail="No file uploaded")
-    
-    valid_image_types = [
-        "image/jpeg",  # JPEG
-        "image/jpg",   # JPG
-        "image/png",   # PNG
-        "image/gif",   # GIF
-        "image/bmp",   # BMP
-        "image/tiff",  # TIFF
-        "image/webp"   # WEBP
-    ]
-    
-    if upload_file.content_type not in valid_image_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid file type: {upload_file.content_type}. Only JPEG, PNG, GIF, BMP, TIFF, and WEBP images are allowed."
-        )
+def upload_file(db : Session, current_user, path: str):
+    user = db.get(DbUser, current_user.id)
+    user.profile_picture = path
     db.commit()
-    db.refresh(current_user)
     return {
             "info": "Profile picture uploaded successfully", 
-            "file_path": path
+            "file_path": path,
+            "thumbnails": profile_pictures.thumbnail_paths(path)
         }
 
-def create_user(db : Session, request: UserBase):
+def check_new_user(db : Session, request: UserBase):
     user = db.query(DbUser).filter(DbUser.username == request.username).first()
     if user:
         raise HTTPException(
@@ -109,10 +111,13 @@ def create_user(db : Session, request: UserBase):
             detail=f"Email: '{request.email}' is already taken."
         )
 
+# the routes run these checks before hashing the password, they are repeated here within the writing session
+def create_user(db : Session, request: UserBase, password_hash: str):
+    check_new_user(db, request)
     new_user = DbUser (
         username = request.username,
         email = request.email,
-        password = Hash.bcrypt(request.password),
+        password = password_hash,
         first_name = request.first_name,
         last_name = request.last_name,
         date_of_birth = request.date_of_birth,
@@ -166,10 +171,13 @@ def update_user(db : Session, username: str, request: UserBase):
         DbUser.gender : request.gender,
         DbUser.phone_number : request.phone_number
     })
+    user_id = user.first().id
     db.commit()
+    hotel_cache.clear()  # hotel responses embed the owner's username
+    user_cache.invalidate(user_id)
     return f"User: {user.first().first_name} {user.first().last_name} Updated!"
 
-def update_user_by_id(db : Session, id: int, request: UserBase, current_user: DbUser):
+def check_user_update(db : Session, id: int, request: UserBase, current_user: DbUser):
     if id is not None:
         user = db.query(DbUser).filter(DbUser.id == id)
         if not user.first():
@@ -193,11 +201,16 @@ def update_user_by_id(db : Session, id: int, request: UserBase, current_user: Db
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Email: '{request.email}' is already taken."
         )
-     
+    if request.is_admin != current_user.is_admin and not current_user.is_admin:
+        raise get_admin_exception()
+
+def update_user_by_id(db : Session, id: int, request: UserBase, current_user: DbUser, password_hash: str):
+    check_user_update(db, id, request, current_user)
+    user = db.query(DbUser).filter(DbUser.id == id)
     update_data = {
         DbUser.username: request.username,
         DbUser.email: request.email,
-        DbUser.password: Hash.bcrypt(request.password),
+        DbUser.password: password_hash,
         DbUser.first_name: request.first_name,
         DbUser.last_name: request.last_name,
         DbUser.date_of_birth: request.date_of_birth,
@@ -205,11 +218,10 @@ def update_user_by_id(db : Session, id: int, request: UserBase, current_user: Db
         DbUser.phone_number: request.phone_number,
         DbUser.is_admin: request.is_admin
     }
-    if request.is_admin != current_user.is_admin and not current_user.is_admin:
-        raise get_admin_exception()
-
     user.update(update_data)        
     db.commit()
+    hotel_cache.clear()  # hotel responses embed the owner's username
+    user_cache.invalidate(id)
     return f"User: {user.first().first_name} {user.first().last_name} Updated!"
 
 def delete_user(db : Session, username: str):
@@ -219,6 +231,7 @@ def delete_user(db : Session, username: str):
 
     db.delete(user)
     db.commit()
+    hotel_cache.clear()
     return f"User: {user.first_name} {user.last_name} Deleted!"
 
 def delete_user_by_id(db : Session, id: int, current_user: DbUser):
@@ -230,11 +243,12 @@ def delete_user_by_id(db : Session, id: int, current_user: DbUser):
             raise get_admin_exception()
     elif id is None and  not current_user.is_admin:
         raise get_admin_exception() 
-    db.query(DbHotel).filter(DbHotel.user_id == id).delete()
-
-    db.delete(user)
+    detail = f"User: {user.first_name} {user.last_name} and associated hotels are Deleted!"
+    deleted = db_deletion.delete_user(db, user.id)
     db.commit()
-    return f"User: {user.first_name} {user.last_name} and associated hotels are Deleted!"
+    hotel_cache.clear()
+    user_cache.invalidate(id)
+    return {"detail": detail, "deleted": deleted}
 
 def is_admin(current_user: UserBase):
     if not current_user.is_admin:
@@ -1,10 +1,52 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
 from  passlib.context import CryptContext
 
-password_cxt = CryptContext(schemes= 'bcrypt', deprecated = 'auto')
+# cost of new hashes; stored hashes of another cost are rehashed on the next successful login
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+# bcrypt runs in this many worker processes, so hashing never holds the GIL or a threadpool slot of the API
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 1))
+
+password_cxt = CryptContext(schemes= 'bcrypt', deprecated = 'auto', bcrypt__rounds = BCRYPT_ROUNDS)
+
+hash_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    global hash_pool
+    if hash_pool is None:
+        hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    return hash_pool
+
+
+def shutdown_hash_pool():
+    global hash_pool
+    if hash_pool is not None:
+        hash_pool.shutdown()
+        hash_pool = None
+
+
+def hash_password(password: str) -> str:
+    return password_cxt.hash(password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return password_cxt.verify_and_update(plain_password, hashed_password)
+
 
 class Hash():
     def bcrypt(password: str):
         return password_cxt.hash(password)
-    
+
     def verify(hashed_password, plain_password):
-        return password_cxt.verify(plain_password, hashed_password)
\ No newline at end of file
+        return password_cxt.verify(plain_password, hashed_password)
+
+    async def bcrypt_async(password: str):
+        return await asyncio.get_running_loop().run_in_executor(get_hash_pool(), hash_password, password)
+
+    async def verify_and_update_async(hashed_password, plain_password):
+        # (valid, new hash) where the new hash is set when the stored one needs an update
+        return await asyncio.get_running_loop().run_in_executor(get_hash_pool(), verify_and_update_password,
+                                                                plain_password, hashed_password)
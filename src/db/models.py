@@ -1,6 +1,6 @@
 from db.database import Base
-from sqlalchemy import Column, Enum, JSON, ForeignKey, CheckConstraint, UniqueConstraint
-from sqlalchemy.sql.sqltypes import Integer, String, Date, Boolean
+from sqlalchemy import Column, Enum, JSON, ForeignKey, CheckConstraint, UniqueConstraint, Index
+from sqlalchemy.sql.sqltypes import Integer, String, Date, Boolean, Float
 from db.gender_enum import GenderEnum
 from sqlalchemy.orm import relationship
 
@@ -35,11 +35,16 @@ class DbHotel(Base):
     phone_number = Column(String)
     description = Column(String)
     rating = Column(Integer , default=0)
+    rating_sum = Column(Integer, default=0, server_default="0", nullable=False)  # kept in step with ratings by db_rating
+    rating_count = Column(Integer, default=0, server_default="0", nullable=False)
+    score = Column(Float, default=3.0, server_default="3.0", nullable=False)  # Bayesian average, see db_rating
     ratings = relationship("DbRating", back_populates="rated_hotel")
-    user_id = Column(Integer, ForeignKey("users.id"))  # ForeignKey to users table
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)  # ForeignKey to users table
     owner = relationship("DbUser", back_populates="hotels")
     available = Column(Boolean, default=True)
     bookings = relationship("DbBooking", back_populates="hotel")  # Link to bookings
+    __table_args__ = (Index('ix_hotels_city_available', 'city', 'available'),
+                      Index('ix_hotels_city_score', 'city', 'score'))
 
 
 
@@ -75,6 +80,7 @@ class DbRating(Base):
     rated_booking = relationship("DbBooking", back_populates="ratings")
     rated_hotel = relationship("DbHotel", back_populates="ratings")
     user = relationship("DbUser", back_populates="ratings")
+    __table_args__ = (Index('ix_ratings_hotel_id_rating_date', 'hotel_id', 'rating_date'),)
 
 
 class DbRoom(Base):
@@ -87,3 +93,11 @@ class DbRoom(Base):
     hotel = relationship("DbHotel")
     __table_args__ = (UniqueConstraint('hotel_id', 'guests_count', name='_room_uc'),)
 
+
+class DbRoomOccupancy(Base):
+    __tablename__ = 'room_occupancy'
+    room_id = Column(Integer, ForeignKey("rooms.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # one row per booked night, (room_id, day) is the index
+    rooms_taken = Column(Integer, default=0)
+    version = Column(Integer, nullable=False)  # concurrent writers of the same row fail with StaleDataError
+    __mapper_args__ = {'version_id_col': version}
@@ -1,28 +1,32 @@
-import booking.controller, rooms.controller
+import booking.controller, rooms.controller, search.controller
 from fastapi import FastAPI, Request, status
 from router import user_get, user_post, hotel, rating
-from db import models
-from db.database import engine, SessionLocal
+from db.database import SessionLocal, get_pool_stats
 from exceptions import InconsistentDatesException, DatesException
-from booking.exceptions import BookingStatusException, BookingNotFoundException, BookingException
+from booking.exceptions import BookingStatusException, BookingNotFoundException, BookingException, \
+    BookingConflictException
 from fastapi.responses import JSONResponse
 from auth import authentication
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from db.models import DbUser
-from db.hash import Hash
+from db.hash import Hash, shutdown_hash_pool
 from contextlib import asynccontextmanager
 import datetime
+import time
 import data
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    data.create_admin_user()
-    data.create_dummy_users()
-    data.create_hotel()
-    data.create_dummy_bookings()
+    started = time.perf_counter()
+    data.create_tables()
+    data.seed_database()
+    data.create_hotel_search_table()
+    await data.create_room_occupancy()
+    print(f"Startup finished in {(time.perf_counter() - started) * 1000:.0f} ms (seed mode: {data.SEED_MODE}).")
     yield
+    shutdown_hash_pool()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -34,14 +38,17 @@ app.include_router(booking.controller.router)
 app.include_router(authentication.router)
 app.include_router(rating.router)
 app.include_router(rooms.controller.router)
+app.include_router(search.controller.router)
 
 
-models.Base.metadata.create_all(engine)
-
 @app.get("/")
 def read_root():
     return "Hello PyBooking!"
 
+@app.get("/metrics/db-pool")
+def read_db_pool_stats():
+    return get_pool_stats()
+
 app.mount('/files', StaticFiles(directory="files"), name='files')
 
 
@@ -59,6 +66,13 @@ def booking_not_found_exception_handler(request: Request, exc: BookingNotFoundEx
         content={'detail': exc.message}
     )
 
+@app.exception_handler(BookingConflictException)
+def booking_conflict_exception_handler(request: Request, exc: BookingConflictException):
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={'detail': exc.message}
+    )
+
 @app.exception_handler(BookingException)
 def booking_exception_handler(request: Request, exc: BookingException):
     return JSONResponse(
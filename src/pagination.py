@@ -0,0 +1,28 @@
+from typing import Callable, Dict, Optional
+from fastapi import Response
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = 'X-Next-After'
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+STREAM_CHUNK_SIZE = 500
+
+
+def next_cursor(items: list, limit: int, cursor: Callable = lambda item: item.id) -> Optional[str]:
+    # A full page means there may be more rows; clients pass the header value back as `after`
+    if len(items) == limit:
+        return str(cursor(items[-1]))
+    return None
+
+
+def next_cursor_headers(items: list, limit: int, cursor: Callable = lambda item: item.id) -> Dict[str, str]:
+    after = next_cursor(items, limit, cursor)
+    return {} if after is None else {NEXT_CURSOR_HEADER: after}
+
+
+def set_next_cursor(response: Response, items: list, limit: int, cursor: Callable = lambda item: item.id):
+    response.headers.update(next_cursor_headers(items, limit, cursor))
+
+
+def to_ndjson_line(item) -> str:
+    return item.model_dump_json() + '\n'
@@ -0,0 +1,121 @@
+import os
+import re
+from datetime import datetime
+from typing import List, Optional
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+UPLOAD_DIRECTORY = 'files'
+MAX_UPLOAD_BYTES = int(os.environ.get('PROFILE_PICTURE_MAX_BYTES', 5 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# longest side in pixels of the variants written next to every upload
+THUMBNAIL_SIZES = (64, 256)
+
+# leading bytes of every accepted format; WEBP is a RIFF container with the format name at offset 8
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff')
+]
+# stored files always carry the extension of the detected format, never the client's, so /files serves them as images
+IMAGE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/bmp': '.bmp',
+    'image/tiff': '.tiff',
+    'image/webp': '.webp'
+}
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def get_too_large_exception():
+    return HTTPException(status_code=413,
+                         detail=f"Profile picture is larger than {MAX_UPLOAD_BYTES} bytes.")
+
+
+async def save_upload(upload_file: UploadFile) -> str:
+    if not upload_file.filename:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    if upload_file.size is not None and upload_file.size > MAX_UPLOAD_BYTES:
+        raise get_too_large_exception()
+
+    # the format is decided by the content, not by the client's content type, before anything is written
+    chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+    content_type = sniff_image_type(chunk)
+    if content_type is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid file type. Only JPEG, PNG, GIF, BMP, TIFF, and WEBP images are allowed."
+        )
+
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    stem = re.sub(r'[^\w-]', '_', os.path.splitext(os.path.basename(upload_file.filename))[0])[:64]
+    path = f'{UPLOAD_DIRECTORY}/{timestamp}_{stem}{IMAGE_EXTENSIONS[content_type]}'
+    # written under a temporary name, so a rejected or broken upload never shows up as a picture
+    partial_path = path + '.part'
+    size = 0
+    try:
+        async with aiofiles.open(partial_path, 'wb') as buffer:
+            while chunk:
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise get_too_large_exception()
+                await buffer.write(chunk)
+                chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+        await aiofiles.os.replace(partial_path, path)
+    except BaseException:
+        if await aiofiles.os.path.exists(partial_path):
+            await aiofiles.os.remove(partial_path)
+        raise
+    return path
+
+
+def thumbnail_path(path: str, size: int) -> str:
+    root, extension = os.path.splitext(path)
+    return f'{root}_{size}{extension}'
+
+
+def thumbnail_paths(path: str) -> List[str]:
+    return [thumbnail_path(path, size) for size in THUMBNAIL_SIZES]
+
+
+def create_thumbnails(path: str):
+    # runs as a background task after the response; the upload is already stored when this fails
+    from PIL import Image
+    try:
+        with Image.open(path) as image:
+            for size in THUMBNAIL_SIZES:
+                thumbnail = image.copy()
+                thumbnail.thumbnail((size, size))
+                thumbnail.save(thumbnail_path(path, size), format=image.format)
+    except Exception as e:
+        print(f"An error occurred while creating thumbnails of {path}: {e}")
+
+
+def get_variant(path: str, size: Optional[int]) -> str:
+    # the smallest existing thumbnail covering the requested size, otherwise the original
+    if size is not None:
+        for thumbnail_size in THUMBNAIL_SIZES:
+            if thumbnail_size >= size and os.path.exists(thumbnail_path(path, thumbnail_size)):
+                return thumbnail_path(path, thumbnail_size)
+    return path
+
+
+def remove_thumbnails(path: str):
+    for thumbnail in thumbnail_paths(path):
+        if os.path.exists(thumbnail):
+            os.remove(thumbnail)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 60
+LISTING_TAG = 'hotels'
+
+
+def hotel_tag(hotel_id: int) -> str:
+    return f'hotel:{hotel_id}'
+
+
+class CachedResponse:
+    def __init__(self, body: bytes, headers: Dict[str, str], tags: Iterable[str], ttl: float):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.headers = headers
+        self.tags = set(tags)
+        self.deadline = time.monotonic() + ttl
+
+
+class ResponseCache:
+    # LRU of serialized JSON responses; entries carry tags so a write drops exactly the responses showing it
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: 'OrderedDict[str, CachedResponse]' = OrderedDict()
+        self.keys_by_tag = defaultdict(set)
+        self.generation = 0
+
+    def respond(self, request: Request, tags: Iterable[str], build: Callable[[], Tuple[object, Dict[str, str]]]):
+        key = cache_key(request)
+        entry = self.get(key)
+        if entry is None:
+            generation = self.generation
+            content, headers = build()
+            body = json.dumps(jsonable_encoder(content), separators=(',', ':')).encode()
+            entry = CachedResponse(body, headers, tags, self.ttl)
+            self.put(key, entry, generation)
+        headers = {**entry.headers, 'ETag': entry.etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request.headers.get('if-none-match'), entry.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=entry.body, media_type='application/json', headers=headers)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.deadline <= time.monotonic():
+                self.discard(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedResponse, generation: int):
+        with self.lock:
+            # an invalidation while the response was built means it may already be stale
+            if generation != self.generation:
+                return
+            self.discard(key)
+            self.entries[key] = entry
+            for tag in entry.tags:
+                self.keys_by_tag[tag].add(key)
+            while len(self.entries) > self.max_entries:
+                self.discard(next(iter(self.entries)))
+
+    def invalidate(self, *tags: str):
+        with self.lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self.keys_by_tag.get(tag, ())):
+                    self.discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.keys_by_tag.clear()
+
+    def discard(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self.keys_by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_tag[tag]
+
+
+def cache_key(request: Request) -> str:
+    return request.url.path + '?' + '&'.join(f'{name}={value}' for name, value
+                                             in sorted(request.query_params.multi_items()))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison, a W/ prefix does not prevent a match
+    return if_none_match.strip() == '*' or etag in (value.strip().removeprefix('W/')
+                                                    for value in if_none_match.split(','))
+
+
+hotel_cache = ResponseCache()
@@ -1,7 +1,10 @@
 import datetime
-from fastapi import APIRouter, Depends, status
+from typing import List
+from fastapi import APIRouter, Depends, Query, status
 from auth.oauth2 import get_current_user
-from rooms.dto import RoomDto, RoomRequest
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import get_async_db
+from rooms.dto import RoomDto, RoomRequest, RoomCalendarDto
 from schemas import UserBase
 from rooms.service import RoomsService
 
@@ -16,9 +19,10 @@ router = APIRouter(
             summary='Retrieves list of all rooms in the given hotel',
             description='Retrieves list of all rooms from the application''s database',
             response_description="List of all rooms")
-def get_rooms_by_hotel_id(hotel_id: int, current_user: UserBase = Depends(get_current_user)):
-    service = RoomsService(current_user)
-    return service.get_rooms_by_hotel_id(hotel_id)
+async def get_rooms_by_hotel_id(hotel_id: int, db: AsyncSession = Depends(get_async_db),
+                                current_user: UserBase = Depends(get_current_user)):
+    service = RoomsService(db, current_user)
+    return await service.get_rooms_by_hotel_id(hotel_id)
 
 
 @router.get('/get_available_rooms',
@@ -26,37 +30,54 @@ def get_rooms_by_hotel_id(hotel_id: int, current_user: UserBase = Depends(get_cu
             description='Retrieves list of all available rooms in the given hotel for given period'
                         ' from the application''s database',
             response_description="List of all available rooms")
-def get_available_rooms_by_hotel_id_and_period(hotel_id: int, checkin: datetime.date, checkout: datetime.date,
-                                               current_user: UserBase = Depends(get_current_user)):
-    service = RoomsService(current_user)
-    return service.get_available_rooms_by_hotel_id_and_period(hotel_id, checkin, checkout)
+async def get_available_rooms_by_hotel_id_and_period(hotel_id: int, checkin: datetime.date, checkout: datetime.date,
+                                                     db: AsyncSession = Depends(get_async_db),
+                                                     current_user: UserBase = Depends(get_current_user)):
+    service = RoomsService(db, current_user)
+    return await service.get_available_rooms_by_hotel_id_and_period(hotel_id, checkin, checkout)
+
+
+@router.get('/calendar',
+            response_model=List[RoomCalendarDto],
+            summary='Retrieves per day availability of all rooms in the given hotel for given period',
+            description='Retrieves remaining rooms count per room type for every day in [from, to)'
+                        ' from the application''s database',
+            response_description="Availability calendar of all rooms")
+async def get_calendar(hotel_id: int, date_from: datetime.date = Query(alias='from'),
+                       date_to: datetime.date = Query(alias='to'), db: AsyncSession = Depends(get_async_db),
+                       current_user: UserBase = Depends(get_current_user)):
+    service = RoomsService(db, current_user)
+    return await service.get_calendar(hotel_id, date_from, date_to)
 
 
 @router.get('/{room_id}',
             summary='Retrieves room by the given id in the given hotel',
             description='Retrieves room by the given id in the given hotel from the application''s database',
             response_description="Single room")
-def get_room_by_id(room_id: int, current_user: UserBase = Depends(get_current_user)):
-    service = RoomsService(current_user)
-    return service.get_room_by_id(room_id)
+async def get_room_by_id(room_id: int, db: AsyncSession = Depends(get_async_db),
+                         current_user: UserBase = Depends(get_current_user)):
+    service = RoomsService(db, current_user)
+    return await service.get_room_by_id(room_id)
 
 
 @router.post('/rooms',
              summary='Creates new room for the given hotel',
              description='Creates new room for the given hotel in the application''s database',
              response_description="New created room")
-def create_new_room(hotel_id: int, request: RoomRequest,  current_user: UserBase = Depends(get_current_user)):
-    service = RoomsService(current_user)
-    return service.create_new_room(hotel_id, request)
+async def create_new_room(hotel_id: int, request: RoomRequest, db: AsyncSession = Depends(get_async_db),
+                          current_user: UserBase = Depends(get_current_user)):
+    service = RoomsService(db, current_user)
+    return await service.create_new_room(hotel_id, request)
 
 
 @router.put('/{room_id}',
             summary='Updates room with the given id for the given hotel',
             description='Updates room with the given id for the given hotel in the application''s database',
             response_description="Updated room")
-def update_room(room_id: int, request: RoomRequest, current_user: UserBase = Depends(get_current_user)):
-    service = RoomsService(current_user)
-    return service.update(room_id, request)
+async def update_room(room_id: int, request: RoomRequest, db: AsyncSession = Depends(get_async_db),
+                      current_user: UserBase = Depends(get_current_user)):
+    service = RoomsService(db, current_user)
+    return await service.update(room_id, request)
 
 
 @router.delete('/{room_id}',
@@ -64,6 +85,7 @@ def update_room(room_id: int, request: RoomRequest, current_user: UserBase = Dep
                description='Deletes room with the given id for the given hotel in the application''s database',
                response_description="Returns HTTP status = 204",
                status_code=status.HTTP_204_NO_CONTENT)
-def delete_room(room_id: int, current_user: UserBase = Depends(get_current_user)):
-    service = RoomsService(current_user)
-    service.remove(room_id)
+async def delete_room(room_id: int, db: AsyncSession = Depends(get_async_db),
+                      current_user: UserBase = Depends(get_current_user)):
+    service = RoomsService(db, current_user)
+    await service.remove(room_id)
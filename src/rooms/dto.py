@@ -1,5 +1,6 @@
 import datetime
 from schemas import Hotel
+from typing import List
 from pydantic import BaseModel, field_validator
 
 
@@ -11,6 +12,19 @@ class RoomDto(BaseModel):
     hotel: Hotel
 
 
+class RoomDayDto(BaseModel):
+    day: datetime.date
+    available_count: int
+
+
+class RoomCalendarDto(BaseModel):
+    room_id: int
+    rooms_amount: int
+    guests_count: int
+    status: bool
+    days: List[RoomDayDto]
+
+
 class RoomRequest(BaseModel):
     rooms_amount: int
     guests_count: int
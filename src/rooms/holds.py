@@ -0,0 +1,86 @@
+import heapq
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from rooms.occupancy import Stay
+
+DEFAULT_HOLD_MINUTES = 10
+MAX_HOLD_MINUTES = 30
+
+
+class Hold:
+    def __init__(self, username: str, hotel_id: int, room_id: int, checkin: date, checkout: date,
+                 rooms_amount: int, minutes: int):
+        self.id = uuid.uuid4().hex
+        self.username = username
+        self.hotel_id = hotel_id
+        self.room_id = room_id
+        self.checkin = checkin
+        self.checkout = checkout
+        self.rooms_amount = rooms_amount
+        self.deadline = time.monotonic() + minutes * 60
+        self.expires_at = datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+    def stay(self) -> Stay:
+        return self.checkin, self.checkout, self.rooms_amount
+
+
+class HoldStore:
+    # Holds live in this process only: a heap ordered by deadline expires them lazily on every access,
+    # holds removed before their deadline are just skipped when their heap entry comes up
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.deadlines = []
+        self.holds: Dict[str, Hold] = {}
+        self.holds_by_room: Dict[int, Set[str]] = defaultdict(set)
+
+    def add(self, hold: Hold) -> Hold:
+        with self.lock:
+            self.expire()
+            heapq.heappush(self.deadlines, (hold.deadline, hold.id))
+            self.holds[hold.id] = hold
+            self.holds_by_room[hold.room_id].add(hold.id)
+        return hold
+
+    def get(self, hold_id: str) -> Optional[Hold]:
+        with self.lock:
+            self.expire()
+            return self.holds.get(hold_id)
+
+    def remove(self, hold_id: str) -> Optional[Hold]:
+        with self.lock:
+            self.expire()
+            return self.discard(hold_id)
+
+    def get_by_room(self, room_id: int, start: date, end: date) -> List[Hold]:
+        with self.lock:
+            self.expire()
+            return [self.holds[hold_id] for hold_id in self.holds_by_room.get(room_id, ())
+                    if self.holds[hold_id].checkin < end and self.holds[hold_id].checkout > start]
+
+    def held_room_ids(self) -> Set[int]:
+        with self.lock:
+            self.expire()
+            return set(self.holds_by_room)
+
+    def expire(self) -> None:
+        now = time.monotonic()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            _, hold_id = heapq.heappop(self.deadlines)
+            self.discard(hold_id)
+
+    def discard(self, hold_id: str) -> Optional[Hold]:
+        hold = self.holds.pop(hold_id, None)
+        if hold is not None:
+            room_hold_ids = self.holds_by_room[hold.room_id]
+            room_hold_ids.discard(hold_id)
+            if not room_hold_ids:
+                del self.holds_by_room[hold.room_id]
+        return hold
+
+
+holds = HoldStore()
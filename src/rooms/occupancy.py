@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+from itertools import accumulate
+from typing import Iterable, List, Tuple
+
+# (checkin, checkout, rooms_amount) of a single booking; checkout night is not occupied
+Stay = Tuple[date, date, int]
+
+
+def clip_stay(stay: Stay, start: date, end: date):
+    checkin, checkout, rooms_amount = stay
+    return max(checkin, start), min(checkout, end), rooms_amount
+
+
+def peak_occupancy(stays: Iterable[Stay], start: date, end: date) -> int:
+    events = []
+    for stay in stays:
+        checkin, checkout, rooms_amount = clip_stay(stay, start, end)
+        if checkin < checkout:
+            events.append((checkin, rooms_amount))
+            events.append((checkout, -rooms_amount))
+    # on the same day departures (negative) sort before arrivals, so back-to-back stays don't overlap
+    events.sort()
+    peak = current = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def daily_occupancy(stays: Iterable[Stay], start: date, end: date) -> List[int]:
+    days_count = (end - start).days
+    if days_count <= 0:
+        return []
+    deltas = [0] * (days_count + 1)
+    for stay in stays:
+        checkin, checkout, rooms_amount = clip_stay(stay, start, end)
+        if checkin < checkout:
+            deltas[(checkin - start).days] += rooms_amount
+            deltas[(checkout - start).days] -= rooms_amount
+    return list(accumulate(deltas[:days_count]))
+
+
+def days_between(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=offset) for offset in range((end - start).days)]
@@ -1,54 +1,153 @@
 import functools
+from collections import defaultdict
+from datetime import date, timedelta
 
-from sqlalchemy.orm.session import Session
-from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy import select, delete, and_, func
 from typing import List, Optional
-from db.models import DbRoom, DbHotel, DbUser, DbBooking
-from booking.dto import BookingPostRequest
+from db.models import DbRoom, DbHotel, DbUser, DbBooking, DbRoomOccupancy
+from rooms.occupancy import daily_occupancy, days_between, peak_occupancy
+from rooms.holds import holds
 
 
 class RoomsRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get(self, room_id: int) -> Optional[DbRoom]:
-        return self.db.get(DbRoom, room_id)
-
-    def get_by_hotel_id_and_guests_count(self, hotel_id: int, guests_count: int) -> Optional[DbRoom]:
-        return next(iter(self.get_rooms_by_hotel_id(hotel_id, guests_count)), None)
-
-    def get_available_rooms_count(self, request: BookingPostRequest) -> Optional[int]:
-        occupied_count = self.get_occupied_rooms_count(request)
-        if occupied_count is None:
-            return None
-        room = self.get(request.room_id)
-        return room.rooms_amount - occupied_count
-
-    def get_occupied_rooms_count(self, request: BookingPostRequest) -> Optional[int]:
-        room = self.get(request.room_id)
-        if room is None:
-            return None
-        bookings = (self.db.query(DbBooking)
-                    .filter(DbBooking.room_id == room.id)
-                    .filter(
-            and_(DbBooking.checkin < request.checkout,
-                 DbBooking.checkout > request.checkin
-                 )
-        ).all())
-        bookings_rooms_amounts = list(map(lambda booking: booking.rooms_amount, bookings))
-        if len(bookings_rooms_amounts) == 0:
-            bookings_rooms_amounts = [0]
-        return max(bookings_rooms_amounts)
-
-    def get_rooms_by_hotel_id(self, hotel_id: int, guests_count: Optional[int] = None):
-        return (self.db.query(DbRoom)
-                .filter(DbRoom.hotel_id == hotel_id)
-                .filter(True if guests_count is None else DbRoom.guests_count == guests_count)
-                .all())
+    async def get(self, room_id: int) -> Optional[DbRoom]:
+        return await self.db.get(DbRoom, room_id,
+                                 options=[joinedload(DbRoom.hotel).joinedload(DbHotel.owner)])
+
+    async def get_hotel(self, hotel_id: int) -> Optional[DbHotel]:
+        return await self.db.get(DbHotel, hotel_id, options=[joinedload(DbHotel.owner)])
+
+    async def get_hotels_by_ids(self, hotel_ids) -> List[DbHotel]:
+        return list(await self.db.scalars(select(DbHotel).options(joinedload(DbHotel.owner))
+                                          .where(DbHotel.id.in_(hotel_ids))))
+
+    async def get_by_ids(self, room_ids: List[int]) -> List[DbRoom]:
+        return list(await self.db.scalars(select(DbRoom).where(DbRoom.id.in_(room_ids))))
+
+    async def get_by_hotel_id_and_guests_count(self, hotel_id: int, guests_count: int) -> Optional[DbRoom]:
+        return next(iter(await self.get_rooms_by_hotel_id(hotel_id, guests_count)), None)
+
+    async def get_available_rooms_by_hotel_id(self, hotel_id: int, checkin: date, checkout: date):
+        occupied = (select(DbRoomOccupancy.room_id,
+                           func.max(DbRoomOccupancy.rooms_taken).label('occupied_count'))
+                    .join(DbRoom, DbRoom.id == DbRoomOccupancy.room_id)
+                    .where(DbRoom.hotel_id == hotel_id)
+                    .where(DbRoomOccupancy.day >= checkin)
+                    .where(DbRoomOccupancy.day < checkout)
+                    .group_by(DbRoomOccupancy.room_id)
+                    .subquery())
+        rooms = (await self.db.execute(
+            select(DbRoom, DbRoom.rooms_amount - func.coalesce(occupied.c.occupied_count, 0))
+            .outerjoin(occupied, occupied.c.room_id == DbRoom.id)
+            .options(joinedload(DbRoom.hotel))
+            .where(DbRoom.hotel_id == hotel_id))).all()
+        held_room_ids = holds.held_room_ids() & {room.id for room, _ in rooms}
+        if not held_room_ids:
+            return rooms
+        # holds are per day, so rooms having some are recounted day by day against the ledger
+        rows = await self.get_occupancy(list(held_room_ids), checkin, checkout)
+        return [(room, self.get_available_count(room, checkin, checkout, rows) if room.id in held_room_ids
+                 else available_count) for room, available_count in rooms]
+
+    async def get_stays_by_hotel_id(self, hotel_id: int, start: date, end: date):
+        return (await self.db.execute(
+            select(DbBooking.room_id, DbBooking.checkin, DbBooking.checkout, DbBooking.rooms_amount)
+            .where(DbBooking.hotel_id == hotel_id)
+            .where(and_(DbBooking.checkin < end, DbBooking.checkout > start)))).all()
+
+    def get_available_count(self, room: DbRoom, checkin: date, checkout: date, rows: dict,
+                            check_holds: bool = True) -> int:
+        # ledger rows are one-night stays, so the sweep over them and the room's holds finds the busiest night
+        stays = [(day, day + timedelta(days=1), rows[(room.id, day)].rooms_taken)
+                 for day in days_between(checkin, checkout) if (room.id, day) in rows]
+        if check_holds:
+            stays += [hold.stay() for hold in holds.get_by_room(room.id, checkin, checkout)]
+        return room.rooms_amount - peak_occupancy(stays, checkin, checkout)
+
+    async def claim(self, room: DbRoom, checkin: date, checkout: date, rooms_amount: int,
+                    rows: Optional[dict] = None, check_holds: bool = True, flush: bool = True) -> int:
+        # Checks and takes capacity on the same versioned rows, a concurrent claim makes the flush fail.
+        # Converting a hold skips the holds: its capacity was already set aside against them
+        if rows is None:
+            rows = await self.get_occupancy([room.id], checkin, checkout)
+        available_count = self.get_available_count(room, checkin, checkout, rows, check_holds)
+        if available_count >= rooms_amount:
+            await self.change_occupancy(room.id, checkin, checkout, rooms_amount, rows, flush)
+        return available_count
+
+    async def release(self, room_id: int, checkin: date, checkout: date, rooms_amount: int) -> None:
+        await self.change_occupancy(room_id, checkin, checkout, -rooms_amount)
+
+    async def get_occupancy(self, room_ids: List[int], start: date, end: date) -> dict:
+        return {(row.room_id, row.day): row for row in await self.db.scalars(
+            select(DbRoomOccupancy)
+            .where(DbRoomOccupancy.room_id.in_(room_ids))
+            .where(DbRoomOccupancy.day >= start)
+            .where(DbRoomOccupancy.day < end))}
+
+    async def change_occupancy(self, room_id: int, checkin: date, checkout: date, delta: int,
+                               rows: Optional[dict] = None, flush: bool = True) -> None:
+        # rows may be shared between calls (see get_occupancy) so a batch only loads the ledger once,
+        # and with flush=False it writes them all in the single flush before its commit
+        if rows is None:
+            rows = await self.get_occupancy([room_id], checkin, checkout)
+        for day in days_between(checkin, checkout):
+            row = rows.get((room_id, day))
+            if row is None and delta > 0:
+                row = DbRoomOccupancy(room_id=room_id, day=day, rooms_taken=0)
+                self.db.add(row)
+                rows[(room_id, day)] = row
+            if row is not None:
+                row.rooms_taken += delta
+                if row.rooms_taken <= 0:
+                    await self.db.delete(row)
+                    del rows[(room_id, day)]
+        if flush:
+            await self.db.flush()
+
+    async def stake(self, room_id: int, checkin: date, checkout: date, rows: dict) -> None:
+        # bumps the version of every night of the stay without changing a count, missing nights get an empty row
+        for day in days_between(checkin, checkout):
+            row = rows.get((room_id, day))
+            if row is None:
+                row = DbRoomOccupancy(room_id=room_id, day=day, rooms_taken=0)
+                self.db.add(row)
+                rows[(room_id, day)] = row
+            else:
+                flag_modified(row, 'rooms_taken')
+        await self.db.flush()
+
+    async def rebuild_occupancy(self) -> None:
+        await self.db.execute(delete(DbRoomOccupancy))
+        stays_by_room = defaultdict(list)
+        for room_id, checkin, checkout, rooms_amount in await self.db.execute(
+                select(DbBooking.room_id, DbBooking.checkin, DbBooking.checkout, DbBooking.rooms_amount)
+                .where(DbBooking.room_id.isnot(None))):
+            stays_by_room[room_id].append((checkin, checkout, rooms_amount))
+        for room_id, stays in stays_by_room.items():
+            start = min(stay[0] for stay in stays)
+            end = max(stay[1] for stay in stays)
+            for day, rooms_taken in zip(days_between(start, end), daily_occupancy(stays, start, end)):
+                if rooms_taken > 0:
+                    self.db.add(DbRoomOccupancy(room_id=room_id, day=day, rooms_taken=rooms_taken))
+        await self.db.flush()
+
+    async def get_rooms_by_hotel_id(self, hotel_id: int, guests_count: Optional[int] = None):
+        return list(await self.db.scalars(
+            select(DbRoom)
+            .options(joinedload(DbRoom.hotel))
+            .where(DbRoom.hotel_id == hotel_id)
+            .where(True if guests_count is None else DbRoom.guests_count == guests_count)))
 
     def add(self, room: DbRoom) -> DbRoom:
         self.db.add(room)
         return room
 
-    def remove(self, room: DbRoom) -> None:
-        self.db.delete(room)
+    async def remove(self, room: DbRoom) -> None:
+        await self.db.delete(room)
@@ -1,73 +1,101 @@
+from collections import defaultdict
 from datetime import date
-from db.database import get_db
-from db.db_user import get_user
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from db.models import DbUser, DbHotel
 from schemas import UserBase
 from rooms.repository import RoomsRepository
-from rooms.dto import RoomRequest
+from rooms.dto import RoomRequest, RoomCalendarDto, RoomDayDto
+from rooms.occupancy import daily_occupancy, days_between
+from rooms.holds import holds
 from rooms.mapper import room_request_to_db, db_room_to_dto
-from db.db_hotel import get_hotel_db
 from typing import Optional
-from booking.dto import BookingPostRequest
+from exceptions import InconsistentDatesException, DatesException
+
+MAX_CALENDAR_DAYS = 366
 
 
 class RoomsService:
-    def __init__(self, current_user: UserBase):
-        self.db = next(get_db())
+    def __init__(self, db: AsyncSession, current_user: UserBase):
+        self.db = db
         self.repository = RoomsRepository(self.db)
         self.current_user = current_user
 
-    def get_rooms_by_hotel_id(self, hotel_id: int):
-        db_rooms = self.repository.get_rooms_by_hotel_id(hotel_id)
+    async def get_rooms_by_hotel_id(self, hotel_id: int):
+        db_rooms = await self.repository.get_rooms_by_hotel_id(hotel_id)
         result = []
         for db_room in db_rooms:
             result.append(db_room_to_dto(db_room))
         return result
 
-    def get_room_by_id(self, room_id: int):
-        db_room = self.repository.get(room_id)
+    async def get_room_by_id(self, room_id: int):
+        db_room = await self.repository.get(room_id)
         return db_room_to_dto(db_room)
 
-    def get_available_rooms_by_hotel_id_and_period(self, hotel_id: int, checkin: date, checkout: date):
-        request = BookingPostRequest(hotel_id=hotel_id, checkin=checkin, checkout=checkout,
-                                     room_id=1, rooms_amount=1, guests_count=1)
-        list = self.get_rooms_by_hotel_id(hotel_id)
-        for room in list:
-            request.room_id = room.id
-            room.rooms_amount = self.repository.get_available_rooms_count(request)
-        return list
+    async def get_available_rooms_by_hotel_id_and_period(self, hotel_id: int, checkin: date, checkout: date):
+        result = []
+        rooms = await self.repository.get_available_rooms_by_hotel_id(hotel_id, checkin, checkout)
+        for db_room, available_count in rooms:
+            room = db_room_to_dto(db_room)
+            room.rooms_amount = available_count
+            result.append(room)
+        return result
+
+    async def get_calendar(self, hotel_id: int, date_from: date, date_to: date):
+        if date_from >= date_to:
+            raise InconsistentDatesException(f"Dates are inconsistent (start '{date_from}' >= end '{date_to}')")
+        if (date_to - date_from).days > MAX_CALENDAR_DAYS:
+            raise DatesException(f"Calendar period cannot be longer than {MAX_CALENDAR_DAYS} days")
+        stays_by_room = defaultdict(list)
+        stays = await self.repository.get_stays_by_hotel_id(hotel_id, date_from, date_to)
+        for room_id, checkin, checkout, rooms_amount in stays:
+            stays_by_room[room_id].append((checkin, checkout, rooms_amount))
+        days = days_between(date_from, date_to)
+        result = []
+        for db_room in await self.repository.get_rooms_by_hotel_id(hotel_id):
+            occupied_counts = daily_occupancy(stays_by_room[db_room.id] + [
+                hold.stay() for hold in holds.get_by_room(db_room.id, date_from, date_to)], date_from, date_to)
+            result.append(RoomCalendarDto(
+                room_id=db_room.id,
+                rooms_amount=db_room.rooms_amount,
+                guests_count=db_room.guests_count,
+                status=db_room.status,
+                days=[RoomDayDto(day=day, available_count=db_room.rooms_amount - occupied_count)
+                      for day, occupied_count in zip(days, occupied_counts)]
+            ))
+        return result
 
-    def create_new_room(self, hotel_id: int, room: RoomRequest):
-        db_hotel = get_hotel_db(self.db, hotel_id)
+    async def create_new_room(self, hotel_id: int, room: RoomRequest):
+        db_hotel = await self.repository.get_hotel(hotel_id)
+        if db_hotel is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f'Could not find hotel with id: {hotel_id}')
         self.check_hotel_user(db_hotel)
         db_room = room_request_to_db(room, db_hotel)
-        self.check_room_of_type_exists(None, room, hotel_id)
+        await self.check_room_of_type_exists(None, room, hotel_id)
         self.repository.add(db_room)
-        self.db.commit()
-        self.db.refresh(db_room)
+        await self.db.commit()
         return db_room_to_dto(db_room)
 
-    def update(self, room_id: int, room: RoomRequest):
-        db_room = self.repository.get(room_id)
+    async def update(self, room_id: int, room: RoomRequest):
+        db_room = await self.repository.get(room_id)
         self.check_hotel_user(db_room.hotel)
-        self.check_room_of_type_exists(room_id, room, db_room.hotel.id)
+        await self.check_room_of_type_exists(room_id, room, db_room.hotel.id)
         room_request_to_db(room, db_room.hotel, db_room)
-        self.db.commit()
-        self.db.refresh(db_room)
+        await self.db.commit()
         return db_room_to_dto(db_room)
 
-    def remove(self, room_id: int):
-        db_room = self.repository.get(room_id)
+    async def remove(self, room_id: int):
+        db_room = await self.repository.get(room_id)
         if db_room is None:
             HTTPException(status=HTTP_404_NOT_FOUND,
                           detail=f"Rooms with id={room_id} not found")
         self.check_hotel_user(db_room.hotel)
-        self.repository.remove(db_room)
-        self.db.commit()
+        await self.repository.remove(db_room)
+        await self.db.commit()
 
-    def check_room_of_type_exists(self, room_id: Optional[int], room: RoomRequest, hotel_id: int):
-        db_room = self.repository.get_by_hotel_id_and_guests_count(hotel_id, room.guests_count)
+    async def check_room_of_type_exists(self, room_id: Optional[int], room: RoomRequest, hotel_id: int):
+        db_room = await self.repository.get_by_hotel_id_and_guests_count(hotel_id, room.guests_count)
         if (not (db_room is None)) and (room_id != db_room.id or room_id is None):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                                 detail=f"Rooms with guests count {db_room.guests_count} already exists"
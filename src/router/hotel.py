@@ -1,10 +1,12 @@
-from typing import List
-from fastapi import APIRouter, Depends,status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from db.database import get_db
-from db import db_hotel
-from schemas import HotelBase, HotelDisplay, UserBase
+from db import db_hotel, db_hotel_search
+from schemas import HotelBase, HotelDisplay, UserBase, IncludeRatingsEnum
 from auth.oauth2 import get_current_user
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor, next_cursor_headers
+from response_cache import hotel_cache, hotel_tag, LISTING_TAG
 
 
 
@@ -25,15 +27,47 @@ def update_hotel(id:int, request: HotelBase, db:Session =Depends(get_db),current
 
 
 # get specific hotel
-@router.get("/hotel", response_model = HotelDisplay, summary="Get a hotel with id", description="Get a hotel with the provided id")
-def get_hotel(id:int = None, db:Session = Depends(get_db)):
-    return db_hotel.get_hotel(db,id)
+@router.get("/hotel", response_model = HotelDisplay, summary="Get a hotel with id", description="Get a hotel with the provided id and none, the latest `ratings_limit` or all of its ratings. Responses carry an ETag and are answered with 304 on a matching If-None-Match")
+def get_hotel(request: Request, id:int = None, include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.latest,
+              ratings_limit: int = Query(db_hotel.DEFAULT_RATINGS_LIMIT, ge=1, le=db_hotel.MAX_RATINGS_LIMIT),
+              db:Session = Depends(get_db)):
+    return hotel_cache.respond(request, [hotel_tag(id)],
+                               lambda: (db_hotel.get_hotel(db,id,include_ratings,ratings_limit), {}))
 
 
 # get all hotels
-@router.get("/", response_model=List[HotelDisplay], summary="Get all hotels", description="Get all hotels from the database")
-def get_all_hotels(db:Session = Depends(get_db)):
-    return db_hotel.get_all_hotels(db)
+@router.get("/", response_model=List[HotelDisplay], summary="Get all hotels", description="Get hotels from the database filtered by city, availability, minimal average rating and owner username, paginated by hotel id (pass the X-Next-After header back as `after`), each with none, the latest `ratings_limit` or all of its ratings. Responses carry an ETag and are answered with 304 on a matching If-None-Match")
+def get_all_hotels(request: Request, city: Optional[str] = None, available: Optional[bool] = None,
+                   min_rating: Optional[float] = Query(None, ge=1, le=5), owner: Optional[str] = None,
+                   after: Optional[int] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                   include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.latest,
+                   ratings_limit: int = Query(db_hotel.DEFAULT_RATINGS_LIMIT, ge=1, le=db_hotel.MAX_RATINGS_LIMIT),
+                   db:Session = Depends(get_db)):
+    def build():
+        hotels = db_hotel.get_all_hotels(db, city, available, min_rating, owner, after, limit, include_ratings,
+                                         ratings_limit)
+        return hotels, next_cursor_headers(hotels, limit)
+    return hotel_cache.respond(request, [LISTING_TAG], build)
+
+# top hotels of a city
+@router.get("/top", response_model=List[HotelDisplay], summary="Get top rated hotels of a city", description="Get the available hotels of the city with the best Bayesian average rating, which pulls hotels with few ratings towards an average score. Responses carry an ETag and are answered with 304 on a matching If-None-Match")
+def get_top_hotels(request: Request, city: str, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+                   include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.none,
+                   ratings_limit: int = Query(db_hotel.DEFAULT_RATINGS_LIMIT, ge=1, le=db_hotel.MAX_RATINGS_LIMIT),
+                   db:Session = Depends(get_db)):
+    return hotel_cache.respond(request, [LISTING_TAG],
+                               lambda: (db_hotel.get_top_hotels(db, city, limit, include_ratings, ratings_limit), {}))
+
+# search hotels
+@router.get("/search", response_model=List[HotelDisplay], summary="Search hotels", description="Full-text search of hotels by name, city, address and description, best matches first, paginated (pass the X-Next-After header back as `after`)")
+def search_hotels(response: Response, q: str = Query(..., min_length=1), after: Optional[str] = None,
+                  limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                  include_ratings: IncludeRatingsEnum = IncludeRatingsEnum.latest,
+                  ratings_limit: int = Query(db_hotel.DEFAULT_RATINGS_LIMIT, ge=1, le=db_hotel.MAX_RATINGS_LIMIT),
+                  db:Session = Depends(get_db)):
+    matches, hotels = db_hotel.search_hotels(db, q, after, limit, include_ratings, ratings_limit)
+    set_next_cursor(response, matches, limit, cursor=lambda match: db_hotel_search.to_cursor(*match))
+    return hotels
 
 # delete hotel
 @router.delete("/delete/{id}", summary="Delete a hotel", description="Delete a hotel with the provided id")
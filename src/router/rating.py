@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from db.database import get_db
 from db import db_rating
-from schemas import RatingBase, RatingDisplay, UserBase
+from schemas import RatingBase, RatingDisplay, RatingSummaryDisplay, UserBase
 from auth.oauth2 import get_current_user
-from typing import List
+from typing import List, Optional
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor
 
 
 router = APIRouter(
@@ -16,13 +17,20 @@ router = APIRouter(
 def create_rating(request:RatingBase, booking_id: int, db: Session = Depends(get_db), current_user: UserBase = Depends(get_current_user)):
     return db_rating.create_rating(db, request, booking_id,current_user)
 
+@router.get("/summary", response_model= RatingSummaryDisplay, summary="Get rating summary of a hotel", description="Get the number of ratings of the hotel with the provided hotel id and how many of them have each score from 1 to 5")
+def get_rating_summary(hotel_id: int, db: Session = Depends(get_db)):
+    return db_rating.get_rating_summary(db, hotel_id)
+
 @router.get("/{rating_id}", response_model = RatingDisplay, summary="Get a rating with id", description="Get a rating with the provided id")
 def get_rating_by_id(rating_id: int, db: Session = Depends(get_db)):
     return db_rating.get_rating_by_id(db, rating_id)
 
-@router.get("/", response_model= List[RatingDisplay], summary="Get all ratings", description="Get all ratings of the hotel from the database with the provided hotel id")
-def get_ratings_by_hotel_id(hotel_id: int, db: Session = Depends(get_db)):
-    return db_rating.get_ratings_by_hotel_id(db, hotel_id)
+@router.get("/", response_model= List[RatingDisplay], summary="Get all ratings", description="Get ratings of the hotel from the database with the provided hotel id, newest first, paginated (pass the X-Next-After header back as `after`)")
+def get_ratings_by_hotel_id(response: Response, hotel_id: int, after: Optional[str] = None,
+                            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_db)):
+    ratings = db_rating.get_ratings_by_hotel_id(db, hotel_id, after, limit)
+    set_next_cursor(response, ratings, limit, cursor=db_rating.rating_cursor)
+    return ratings
 
 @router.put("/update/{rating_id}", response_model= RatingDisplay, summary="Update a rating", description="Update a rating with the provided details")
 def update_rating(request:RatingBase, rating_id: int, db: Session = Depends(get_db),current_user: UserBase = Depends(get_current_user)):
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 from schemas import UserBase, UserDisplay
 from sqlalchemy.orm import Session
 from db.database import get_db
 from db import db_user
+from db.models import DbUser
 from auth.oauth2 import get_current_user
+import profile_pictures
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor
 from fastapi.responses import FileResponse
 from fastapi import HTTPException, status
 import os
@@ -20,8 +23,12 @@ router = APIRouter(
 @router.get("", response_model=List[UserDisplay],
             summary="Get User By username or All Users (Admin Only) ")
 def get_all_users(
+    response: Response,
     username: Optional[str] = None,
     is_admin: Optional[bool] = None,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_hotels: bool = True,
     db: Session = Depends(get_db),
     current_user: UserBase = Depends(get_current_user)
 ):
@@ -35,7 +42,8 @@ def get_all_users(
 
     **Returns**:
 
-    - A list of users with their details.
+    - A page of users ordered by ID, with their details and, unless `include_hotels` is false, their hotels.
+      A full page carries an `X-Next-After` header, pass it back as `after` to get the next page.
 
     **Raises**:
 
@@ -44,7 +52,9 @@ def get_all_users(
 
     """
     db_user.check_current_user(current_user)
-    return db_user.get_all_user(db, current_user, username, is_admin)
+    users = db_user.get_all_user(db, current_user, username, is_admin, after, limit, include_hotels)
+    set_next_cursor(response, users, limit)
+    return users
 
 @router.get('/{id}',
                 summary="Get User by ID",
@@ -66,12 +76,13 @@ def get_user_by_id(id: int, db: Session = Depends(get_db), current_user: UserBas
 
 
 @router.get('/{id}/profile-picture/', response_class= FileResponse, summary="Display user profile picture" )
-def get_picture(id: int, db: Session = Depends(get_db) ,current_user: UserBase = Depends(get_current_user)):
+def get_picture(id: int, size: Optional[int] = Query(None, ge=1), db: Session = Depends(get_db) ,current_user: UserBase = Depends(get_current_user)):
     """
         Displays the authenticated user's profile picture based on their username.
 
         This endpoint returns the profile picture of the currently authenticated user.
         If the user has uploaded a profile picture, the image file will be served as a response.
+        With `size`, the smallest thumbnail at least that many pixels wide and high is served instead, when there is one.
 
         If no profile picture is found for the authenticated user, an **HTTP 404** error will be returned.
     """
@@ -88,7 +99,7 @@ def get_picture(id: int, db: Session = Depends(get_db) ,current_user: UserBase =
     elif id is None and  not current_user.is_admin:
         raise get_admin_exception()
         
-    return user.profile_picture
+    return profile_pictures.get_variant(user.profile_picture, size)
 
 # @router.delete('/delete/username/{username}',                
 #                summary="Delete User by Username")
@@ -158,6 +169,7 @@ def delete_profile_picture(id: int,
     profile_picture_path = current_user.profile_picture
     if os.path.exists(profile_picture_path):
         os.remove(profile_picture_path) 
+        profile_pictures.remove_thumbnails(profile_picture_path)
     else:
         raise HTTPException(
             status_code=404,
@@ -165,8 +177,8 @@ def delete_profile_picture(id: int,
         )
 
 
-    current_user.profile_picture = None
+    user = db.get(DbUser, current_user.id)
+    user.profile_picture = None
     db.commit()
-    db.refresh(current_user)
 
     return "Profile picture deleted successfully"
\ No newline at end of file
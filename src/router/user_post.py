@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from schemas import UserBase, UserDisplay, UserBaseAdmin
 from sqlalchemy.orm import Session
 from db.database import get_db
 from db import db_user
+from db.hash import Hash
 from auth.oauth2 import get_current_user
+import profile_pictures
 
 
 router = APIRouter(
@@ -14,7 +17,7 @@ router = APIRouter(
 @router.post('/',
                 summary="Create a New User"
             )
-def create_new_user(request: UserBase, db: Session = Depends(get_db)):
+async def create_new_user(request: UserBase, db: Session = Depends(get_db)):
     """
         Creates a new user in the system with the following requirements:
         
@@ -36,13 +39,17 @@ def create_new_user(request: UserBase, db: Session = Depends(get_db)):
         
         After passing all validations, the user information will be securely stored in the database.
     """
-    return db_user.create_user(db, request)
+    # bcrypt is the expensive part, so requests that fail the checks never reach it
+    await run_in_threadpool(db_user.check_new_user, db, request)
+    password_hash = await Hash.bcrypt_async(request.password)
+    return await run_in_threadpool(db_user.create_user, db, request, password_hash)
 
 
 @router.post('/profile-picture',
                 summary="Upload a new user profile picture")
 
-def upload_file(upload_file : UploadFile = File(...),     
+async def upload_file(background_tasks: BackgroundTasks,
+                upload_file : UploadFile = File(...),     
                 db: Session = Depends(get_db),
                 current_user: UserBase = Depends(get_current_user)
             ):
@@ -50,21 +57,26 @@ def upload_file(upload_file : UploadFile = File(...),
         Uploads a profile picture for the authenticated user.
 
         This function accepts an uploaded file and saves it to a specified location on the server.
-        Before saving, it checks if the uploaded file is an image (`JPEG`, `PNG`, `GIF`, `BMP`, `TIFF`). 
+        Before saving, it checks from the file content if it is an image (`JPEG`, `PNG`, `GIF`, `BMP`, `TIFF`, `WEBP`). 
         If the file type is not supported, an **HTTP 400** error is raised.
+        After the response, thumbnails of the picture are written next to it.
 
         **Returns**:
-        A success message and the path to the uploaded file.
+        A success message, the path to the uploaded file and the paths its thumbnails will have.
 
         **Raises**:
         - **HTTP 400**: If no file is uploaded or if the file is not an image.
+        - **HTTP 413**: If the file is larger than the configured maximum size.
     """
     db_user.check_current_user(current_user)
-    return db_user.upload_file(upload_file, db, current_user)
+    path = await profile_pictures.save_upload(upload_file)
+    result = await run_in_threadpool(db_user.upload_file, db, current_user, path)
+    background_tasks.add_task(profile_pictures.create_thumbnails, path)
+    return result
 
 @router.put('/{id}',
                 summary="Update User Information by ID", )
-def update_user_by_id(id : int,request: UserBaseAdmin, db: Session = Depends(get_db), current_user: UserBase = Depends(get_current_user)):
+async def update_user_by_id(id : int,request: UserBaseAdmin, db: Session = Depends(get_db), current_user: UserBase = Depends(get_current_user)):
     """
         Updates the details of an existing user identified by their unique ID. This endpoint allows an authenticated user to update their own details or an admin to update any user's details. Admins also have the exclusive ability to assign or unassign admin roles.
 
@@ -86,4 +98,6 @@ def update_user_by_id(id : int,request: UserBaseAdmin, db: Session = Depends(get
         Upon successful validation, the user's details are updated in the database.
     """
     db_user.check_current_user(current_user)
-    return db_user.update_user_by_id(db, id, request, current_user)
+    await run_in_threadpool(db_user.check_user_update, db, id, request, current_user)
+    password_hash = await Hash.bcrypt_async(request.password)
+    return await run_in_threadpool(db_user.update_user_by_id, db, id, request, current_user, password_hash)
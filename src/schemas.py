@@ -1,7 +1,8 @@
 from pydantic import BaseModel,field_validator, Field
 from datetime import date
 from db.gender_enum import GenderEnum
-from typing import List, Optional
+from typing import Dict, List, Optional
+from enum import Enum
 
 class Hotel(BaseModel):
     id: int
@@ -86,6 +87,11 @@ class RatingDisplay(BaseModel):
     class Config():
         from_attributes = True
 
+class RatingSummaryDisplay(BaseModel):
+    hotel_id: int
+    count: int
+    histogram: Dict[int, int]  # number of ratings for every score from 1 to 5
+
 class HotelBase(BaseModel):
     name: str
     city: str
@@ -95,6 +101,11 @@ class HotelBase(BaseModel):
     description: str
     available: bool
 
+class IncludeRatingsEnum(str, Enum):
+    none = "none"
+    latest = "latest"
+    all = "all"
+
 class HotelDisplay(BaseModel):
     id: int
     name:str
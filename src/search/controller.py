@@ -0,0 +1,34 @@
+import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Response
+from auth.oauth2 import get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import get_async_db
+from schemas import UserBase
+from search.dto import AvailabilityDto
+from search.service import SearchService
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+
+router = APIRouter(
+    prefix='/search',
+    tags=['search']
+)
+
+
+@router.get('/availability',
+            response_model=List[AvailabilityDto],
+            summary='Search available rooms of all hotels in the given city for given period',
+            description='Retrieves rooms for at least `guests` guests with at least `rooms` rooms free on every night '
+                        'of [checkin, checkout) in the available hotels of the city, by hotel and smallest fitting room '
+                        'first, paginated (pass the X-Next-After header back as `after`)',
+            response_description="List of available rooms with their hotel")
+async def search_availability(response: Response, city: str, checkin: datetime.date, checkout: datetime.date,
+                              guests: int = Query(1, ge=1), rooms: int = Query(1, ge=1), after: Optional[str] = None,
+                              limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                              db: AsyncSession = Depends(get_async_db),
+                              current_user: UserBase = Depends(get_current_user)):
+    service = SearchService(db, current_user)
+    result, next_after = await service.get_availability(city, checkin, checkout, guests, rooms, after, limit)
+    if next_after is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_after
+    return result
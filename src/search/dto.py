@@ -0,0 +1,10 @@
+from schemas import Hotel
+from pydantic import BaseModel
+
+
+class AvailabilityDto(BaseModel):
+    hotel: Hotel
+    room_id: int
+    guests_count: int
+    rooms_amount: int
+    available_count: int
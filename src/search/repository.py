@@ -0,0 +1,37 @@
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import DbRoom, DbHotel, DbUser, DbRoomOccupancy
+
+
+class SearchRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_available_rooms(self, city: str, checkin: date, checkout: date, guests_count: int,
+                                  rooms_amount: int, after: Optional[Tuple[int, int]], limit: int):
+        # hotels come in id order from the (city, available) index and their rooms in guests order from the
+        # (hotel_id, guests_count) one, so no sort is needed and scanning stops once the page is full; the
+        # busiest night of every candidate room is a primary key range lookup in the ledger
+        occupied_count = (select(func.max(DbRoomOccupancy.rooms_taken))
+                          .where(DbRoomOccupancy.room_id == DbRoom.id)
+                          .where(DbRoomOccupancy.day >= checkin)
+                          .where(DbRoomOccupancy.day < checkout)
+                          .correlate(DbRoom)
+                          .scalar_subquery())
+        available_count = (DbRoom.rooms_amount - func.coalesce(occupied_count, 0)).label('available_count')
+        query = (select(DbRoom, DbHotel, available_count)
+                 .join(DbHotel, DbHotel.id == DbRoom.hotel_id)
+                 .join(DbUser, DbUser.id == DbHotel.user_id)
+                 .where(DbHotel.city == city.lower())
+                 .where(DbHotel.available == True)
+                 .where(DbUser.is_active == True)
+                 .where(DbRoom.status == True)
+                 .where(DbRoom.guests_count >= guests_count)
+                 .where(available_count >= rooms_amount))
+        if after is not None:
+            query = query.where(tuple_(DbHotel.id, DbRoom.guests_count) > after)
+        # ordering by the hotels side of the join keeps the index order, rooms.hotel_id would need a sort
+        return (await self.db.execute(query.order_by(DbHotel.id, DbRoom.guests_count).limit(limit))).all()
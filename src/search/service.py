@@ -0,0 +1,62 @@
+from datetime import date
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
+from schemas import UserBase
+from search.repository import SearchRepository
+from search.dto import AvailabilityDto
+from rooms.repository import RoomsRepository
+from rooms.holds import holds
+from exceptions import InconsistentDatesException, DatesException
+from pagination import next_cursor
+
+CURSOR_SEPARATOR = '_'
+
+
+class SearchService:
+    def __init__(self, db: AsyncSession, current_user: UserBase):
+        self.db = db
+        self.repository = SearchRepository(self.db)
+        self.rooms_repository = RoomsRepository(self.db)
+        self.current_user = current_user
+
+    async def get_availability(self, city: str, checkin: date, checkout: date, guests_count: int, rooms_amount: int,
+                               after: Optional[str], limit: int):
+        check_dates(checkin, checkout)
+        rows = await self.repository.get_available_rooms(city, checkin, checkout, guests_count, rooms_amount,
+                                                         parse_cursor(after), limit)
+        # the page is cut on the query rows, so rooms dropped below for their holds don't end the pagination
+        after = next_cursor(rows, limit, cursor=lambda row: to_cursor(row.DbRoom))
+        held_room_ids = holds.held_room_ids() & {row.DbRoom.id for row in rows}
+        occupancy = await self.rooms_repository.get_occupancy(list(held_room_ids), checkin, checkout) \
+            if held_room_ids else {}
+        result = []
+        for db_room, db_hotel, available_count in rows:
+            if db_room.id in held_room_ids:
+                available_count = self.rooms_repository.get_available_count(db_room, checkin, checkout, occupancy)
+                if available_count < rooms_amount:
+                    continue
+            result.append(AvailabilityDto(hotel=db_hotel, room_id=db_room.id, guests_count=db_room.guests_count,
+                                          rooms_amount=db_room.rooms_amount, available_count=available_count))
+        return result, after
+
+
+def check_dates(checkin: date, checkout: date):
+    if checkin >= checkout:
+        raise InconsistentDatesException(f"Dates are inconsistent (start '{checkin}' >= end '{checkout}')")
+    if checkin < date.today():
+        raise DatesException(f"Impossible to search availability in the past ({checkin} < {date.today()})")
+
+
+def to_cursor(db_room) -> str:
+    return f"{db_room.hotel_id}{CURSOR_SEPARATOR}{db_room.guests_count}"
+
+
+def parse_cursor(after: Optional[str]):
+    if after is None:
+        return None
+    try:
+        hotel_id, guests_count = after.split(CURSOR_SEPARATOR)
+        return int(hotel_id), int(guests_count)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid availability cursor: {after}")
@@ -0,0 +1,36 @@
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# cheap hashes for the seeded users, the cost factor is not under test here
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+
+# the engines resolve the relative database path when db.database is imported, which happens while test modules
+# are collected, so every run moves to an empty working directory before that
+workdir = tempfile.mkdtemp(prefix='pybooking-')
+os.makedirs(os.path.join(workdir, 'db'))
+os.makedirs(os.path.join(workdir, 'files'))
+os.chdir(workdir)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def client():
+    import main
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope='session')
+def auth_headers(client):
+    def login(username: str, password: str):
+        token = client.post('/token', data={'username': username, 'password': password}).json()['access_token']
+        return {'Authorization': f'Bearer {token}'}
+    return login
@@ -0,0 +1,56 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from types import SimpleNamespace
+from sqlalchemy import func, select
+from booking.dto import BookingHoldRequest, BookingPostRequest
+from booking.service import BookingService
+from db.database import AsyncSessionLocal, SessionLocal
+from db.models import DbBooking, DbRoom, DbRoomOccupancy
+from rooms.holds import holds
+
+REQUESTS_COUNT = 40
+
+
+def test_concurrent_bookings_never_oversell_a_room(client, auth_headers):
+    headers = auth_headers('john_doe', 'john123')
+    with SessionLocal() as db:
+        room = db.scalars(select(DbRoom).where(DbRoom.hotel_id == 1, DbRoom.guests_count == 1)).one()
+        rooms_amount = room.rooms_amount
+    booking = {'checkin': '2030-03-01', 'checkout': '2030-03-04', 'rooms_amount': 1, 'guests_count': 1,
+               'hotel_id': 1, 'room_id': room.id}
+
+    with ThreadPoolExecutor(max_workers=REQUESTS_COUNT) as executor:
+        responses = list(executor.map(lambda _: client.post('/bookings/', json=booking, headers=headers),
+                                      range(REQUESTS_COUNT)))
+
+    created = [response for response in responses if response.status_code == 201]
+    assert len(created) == rooms_amount
+    assert all(response.status_code in (400, 409) for response in responses if response.status_code != 201)
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count(DbBooking.id)).where(DbBooking.room_id == room.id,
+                                                                DbBooking.checkin == booking['checkin'])) \
+            == rooms_amount
+        assert db.scalar(select(func.max(DbRoomOccupancy.rooms_taken))
+                         .where(DbRoomOccupancy.room_id == room.id)) == rooms_amount
+
+
+async def book_and_hold_concurrently(checkin: str, checkout: str, rooms_amount: int):
+    user = SimpleNamespace(username='john_doe')
+    request = {'checkin': checkin, 'checkout': checkout, 'rooms_amount': rooms_amount, 'guests_count': 1,
+               'hotel_id': 1, 'room_id': 1}
+    async with AsyncSessionLocal() as booking_db, AsyncSessionLocal() as hold_db:
+        return await asyncio.gather(
+            BookingService(booking_db, user).add(BookingPostRequest(**request), user),
+            BookingService(hold_db, user).add_hold(BookingHoldRequest(**request)),
+            return_exceptions=True)
+
+
+def test_a_hold_never_takes_rooms_a_concurrent_booking_claimed(client):
+    for offset in range(10):
+        checkin = date(2032, 1, 1) + timedelta(days=offset * 7)
+        booking, hold = asyncio.run(book_and_hold_concurrently(str(checkin), str(checkin + timedelta(days=3)), 5))
+        succeeded = [result for result in (booking, hold) if not isinstance(result, Exception)]
+        assert len(succeeded) == 1
+        if not isinstance(hold, Exception):
+            holds.remove(hold.id)
@@ -0,0 +1,44 @@
+import random
+from datetime import date, timedelta
+from rooms.occupancy import daily_occupancy, peak_occupancy
+
+START = date(2030, 1, 1)
+
+
+def test_back_to_back_stays_do_not_overlap():
+    stays = [(date(2030, 1, 1), date(2030, 1, 3), 2), (date(2030, 1, 3), date(2030, 1, 5), 2)]
+    assert peak_occupancy(stays, START, date(2030, 1, 5)) == 2
+
+
+def test_stays_are_clipped_to_the_period():
+    stays = [(date(2029, 12, 20), date(2030, 1, 2), 3), (date(2030, 1, 4), date(2030, 1, 9), 4)]
+    assert peak_occupancy(stays, START, date(2030, 1, 4)) == 3
+    assert peak_occupancy(stays, date(2030, 1, 2), date(2030, 1, 4)) == 0
+
+
+def test_peak_matches_the_busiest_day():
+    generator = random.Random(7)
+    for _ in range(200):
+        stays = []
+        for _ in range(generator.randint(0, 30)):
+            checkin = START + timedelta(days=generator.randint(-5, 40))
+            stays.append((checkin, checkin + timedelta(days=generator.randint(1, 10)), generator.randint(1, 4)))
+        end = START + timedelta(days=generator.randint(1, 40))
+        assert peak_occupancy(stays, START, end) == max(daily_occupancy(stays, START, end), default=0)
+
+
+def test_holds_and_bookings_share_the_peak(client, auth_headers):
+    headers = auth_headers('john_doe', 'john123')
+    booking = {'hotel_id': 1, 'room_id': 3, 'guests_count': 3, 'rooms_amount': 2}
+    assert client.post('/bookings/', json={**booking, 'checkin': '2031-06-01', 'checkout': '2031-06-03'},
+                       headers=headers).status_code == 201
+    hold = client.post('/bookings/holds', json={**booking, 'checkin': '2031-06-02', 'checkout': '2031-06-05'},
+                       headers=headers)
+    assert hold.status_code == 201
+
+    # the room has 5, the night of June 2nd has 2 booked and 2 held
+    stay = {'checkin': '2031-06-01', 'checkout': '2031-06-06'}
+    assert client.post('/bookings/', json={**booking, **stay}, headers=headers).status_code == 400
+    assert client.post('/bookings/', json={**booking, **stay, 'rooms_amount': 1}, headers=headers).status_code == 201
+    assert client.delete(f"/bookings/holds/{hold.json()['id']}", headers=headers).status_code == 204
+    assert client.post('/bookings/', json={**booking, **stay}, headers=headers).status_code == 201
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+from sqlalchemy import event
+from db.database import SessionLocal, async_engine
+from db.models import DbHotel, DbRoom, DbRoomOccupancy
+
+
+def create_hotel_with_rooms(room_types_count: int) -> int:
+    with SessionLocal() as db:
+        hotel = DbHotel(name=f'Hotel of {room_types_count}', city='utrecht', address='Oudegracht 1',
+                        description='Query count hotel', user_id=3, available=True, email='hotel@example.com',
+                        phone_number='123456789')
+        db.add(hotel)
+        db.flush()
+        rooms = [DbRoom(rooms_amount=5, guests_count=guests_count, status=True, hotel_id=hotel.id)
+                 for guests_count in range(1, room_types_count + 1)]
+        db.add_all(rooms)
+        db.flush()
+        db.add_all([DbRoomOccupancy(room_id=room.id, day=date(2030, 5, 1) + timedelta(days=offset), rooms_taken=2)
+                    for room in rooms for offset in range(3)])
+        db.commit()
+        return hotel.id
+
+
+def count_statements(client, headers, hotel_id: int, room_types_count: int) -> int:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/rooms/get_available_rooms', headers=headers,
+                              params={'hotel_id': hotel_id, 'checkin': '2030-05-01', 'checkout': '2030-05-05'})
+    finally:
+        event.remove(async_engine.sync_engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    # 5 rooms of every type, 2 of them taken
+    assert [room['rooms_amount'] for room in response.json()] == [3] * room_types_count
+    return len(statements)
+
+
+def test_available_rooms_take_a_constant_number_of_statements(client, auth_headers):
+    headers = auth_headers('jane_smith', 'jane123')
+    one_room_hotel_id = create_hotel_with_rooms(1)
+    many_rooms_hotel_id = create_hotel_with_rooms(50)
+    # the first request resolves the user, later ones find it in the user cache
+    count_statements(client, headers, one_room_hotel_id, 1)
+
+    assert count_statements(client, headers, one_room_hotel_id, 1) == \
+        count_statements(client, headers, many_rooms_hotel_id, 50) == 1